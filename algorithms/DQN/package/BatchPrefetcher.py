@@ -0,0 +1,119 @@
+"""
+
+    Batch prefetcher for the DQN training. Samples the next minibatches from the replay buffer in a background thread
+
+"""
+
+import queue
+import threading
+import time
+import torch
+
+class BatchPrefetcher:
+    """
+        Prepares the next "n_batches" minibatches in a background thread while the current one trains.
+        The states stay uint8 until the agent moves them to the device. Offers the sample/updatePriorities API of the replay buffers
+        so that it can be given to DQNAgent.train_step instead of the replay buffer
+    """
+    def __init__(self, replay_buffer, batch_size, min_size, n_batches=2, pin_memory=None):
+        """
+            params:
+                replay_buffer: Replay buffer to sample from
+                batch_size: Size of the minibatches
+                min_size: Number of transitions the replay buffer must contain before sampling starts
+                n_batches: Number of minibatches prepared in advance
+                pin_memory (boolean): Wether the states are put in pinned memory to speed up the copies to the GPU.
+                                      By default it's enabled when a GPU is available
+        """
+        self.replay_buffer = replay_buffer
+        self.batch_size = batch_size
+        self.min_size = min_size
+        self.pin_memory = torch.cuda.is_available() if pin_memory is None else pin_memory
+        self._batches = queue.Queue(maxsize=n_batches)
+        self._running = False
+        self._error = None
+        self._thread = None
+        # Number of minibatches served and number of them that weren't ready when requested
+        self.n_served = 0
+        self.n_starved = 0
+        self.starved_time = 0
+
+    def __len__(self):
+        return len(self.replay_buffer)
+
+    def start(self):
+        """
+            Start sampling in the background thread
+        """
+        self._running = True
+        self._thread = threading.Thread(target=self._prefetch, daemon=True)
+        self._thread.start()
+
+    def _prefetch(self):
+        try:
+            while self._running:
+                if len(self.replay_buffer) < self.min_size:
+                    time.sleep(0.01)
+                    continue
+                s, a, r, sprime, d, weights, idxs = self.replay_buffer.sample(self.batch_size)
+                s, sprime = torch.from_numpy(s), torch.from_numpy(sprime)
+                if self.pin_memory:
+                    s, sprime = s.pin_memory(), sprime.pin_memory()
+                batch = (s, a, r, sprime, d, weights, idxs)
+                while self._running:
+                    try:
+                        self._batches.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+        except Exception as e:
+            self._error = e
+
+    def raiseError(self):
+        """
+            Raise the error that stopped the prefetcher if there is one
+        """
+        if self._error is not None:
+            raise Exception("The batch prefetcher failed") from self._error
+
+    def sample(self, batch_size):
+        """
+            Return the next prepared minibatch, same format as the sample method of the replay buffers with the states as uint8 tensors
+        """
+        if batch_size != self.batch_size:
+            raise Exception("The prefetcher prepares batches of {} transitions, not {}".format(self.batch_size, batch_size))
+        self.n_served += 1
+        if self._batches.empty():
+            self.n_starved += 1
+        tstart = time.perf_counter()
+        while True:
+            self.raiseError()
+            try:
+                batch = self._batches.get(timeout=0.1)
+                break
+            except queue.Empty:
+                pass
+        self.starved_time += time.perf_counter() - tstart
+        return batch
+
+    def updatePriorities(self, idxs, td_errors):
+        """
+            Update the priorities of the replay buffer (see ReplayBuffer.updatePriorities)
+        """
+        self.replay_buffer.updatePriorities(idxs, td_errors)
+
+    def getStarvation(self):
+        """
+            Return the proportion of minibatches that weren't ready when the training requested them
+        """
+        return self.n_starved / self.n_served if self.n_served > 0 else 0
+
+    def stop(self):
+        """
+            Stop the background thread
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.raiseError()
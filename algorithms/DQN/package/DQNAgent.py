@@ -20,9 +20,14 @@ import config
 import time
 import numpy as np
 import os
+import threading
 # Here you can also import from the package folder
 from package.DQN import DQN
+from package.InferenceEngine import InferenceEngine
 from copy import deepcopy
+from functools import partial
+# And also utility functions
+from utils.BackgroundWriter import BackgroundWriter, atomicSave
 from random import random, randint
 
 def weights_init(m):
@@ -38,26 +43,72 @@ class DQNAgent:
     """
         Agent Wrapper for the DQN algortihm. Handle the model and training of the agent
     """
-    def __init__(self, n_actions, hyperparameters, source_file=None, model_save_path="."):
+    def __init__(self, n_actions, hyperparameters, source_file=None, model_save_path=".", writer=None):
+        """
+            params:
+                n_actions: Number of actions
+                hyperparameters: Dictionnary of hyperparameters (see hyperparameters.json)
+                source_file: Model to start from (policy.pt of a previous training)
+                model_save_path: Folder in which the models are saved
+                writer: BackgroundWriter used to save the models. A new one is created by default
+        """
         self.hyperparameters = hyperparameters
         self.model_save_path = model_save_path
         self.n_actions = n_actions
+        # The models are written to the disk in the background
+        self.writer = writer if writer is not None else BackgroundWriter()
+        # Training step at which each model file was last saved, to skip redundant writes
+        self.saved_steps = {}
+        self.n_steps = 0
         # Create a new model or load if a source file is provided
         if source_file is None:
             self.policy = DQN(config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH, n_actions).to(device)
             self.policy.apply(weights_init)
         else:
-            self.policy = torch.load(source_file).to(device)
+            self.policy = self.loadModel(source_file)
         # Target network
         self.target = DQN(config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH, n_actions).to(device)
         self.target.load_state_dict(self.policy.state_dict())
         self.target.eval()
-        torch.save(deepcopy(self.target).cpu(), self.model_save_path + "/target.pt")
+        self.saveModel(self.target, "target.pt")
         # Use of RMSprop. I've read that RMSprop can be more stable than Adam in non-stationary optimization problems
         self.optimizer = torch.optim.RMSprop(self.policy.parameters(), lr=hyperparameters["learning_rate"])
-        self.n_steps = 0
         self.epsilon = hyperparameters["initial_epsilon"]
         self.last_q_value = 0
+        # Eval-mode copy of the policy used by play. It follows the trained policy through syncPolicy unless the weights are published explicitly with publishPolicy
+        self.inference = InferenceEngine(
+            self.policy,
+            (config.CAPTURE_N_FRAMES + 1, config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH),
+            device,
+            trace=hyperparameters.get("trace_inference", False)
+        )
+        self.inference_steps = 0
+        self.explicit_publish = False
+        # Held during the training steps and the backups when the training runs in another thread
+        self.lock = threading.Lock()
+
+    def loadModel(self, path):
+        """
+            Load a model saved by saveModel (state dict) or by the previous versions (whole module)
+        """
+        loaded = torch.load(path, map_location=device)
+        if isinstance(loaded, nn.Module):
+            return loaded.to(device)
+        model = DQN(config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH, self.n_actions).to(device)
+        model.load_state_dict(loaded)
+        return model
+
+    def saveModel(self, model, name):
+        """
+            Save a snapshot of the state dict of "model" in the file "name" of model_save_path. The file is written atomically by the background writer.
+            Nothing is written if the file was already saved at the current training step. Return the path of the file
+        """
+        path = os.path.join(self.model_save_path, name)
+        if self.saved_steps.get(path) != self.n_steps:
+            self.saved_steps[path] = self.n_steps
+            state_dict = {k: v.detach().to("cpu", copy=True) for k, v in model.state_dict().items()}
+            self.writer.submit(atomicSave, path, partial(torch.save, state_dict))
+        return path
 
     def evalMode(self):
         """
@@ -83,6 +134,31 @@ class DQNAgent:
         """
         return self.last_q_value
 
+    def getInferenceLatency(self):
+        """
+            Return the duration of the forward pass of the last call of "play" in seconds
+        """
+        return self.inference.getLastLatency()
+
+    def publishPolicy(self):
+        """
+            Copy the current policy into the inference engine used by play. Once called, play only uses the published weights.
+            Used when the training runs in another thread
+        """
+        with self.lock:
+            self.inference.load(self.policy)
+            self.inference_steps = self.n_steps
+        self.explicit_publish = True
+
+    def syncPolicy(self):
+        """
+            Copy the policy into the inference engine if it was trained since the last copy. Called after the training steps,
+            so that play only does the forward pass. Does nothing once the weights are published explicitly with publishPolicy
+        """
+        if not self.explicit_publish and self.inference_steps != self.n_steps:
+            self.inference.load(self.policy)
+            self.inference_steps = self.n_steps
+
     def play(self, state):
         """
             Select an action based on the given state.
@@ -93,13 +169,10 @@ class DQNAgent:
         ###     2. This portion of the code execute itself after the obtention of the state, and before the choosen action os performed.
         ###        As a consequence, doing a forward pass every time bring stability in the latency between obtention of the state and commitment of the action.
 
-        # Processing Image + pytorch tensor conversion
-        state = self.preprocess(state)
         # Predict the estimated Q-value in a numpy array
-        qs = self.policy(state).squeeze(0).detach().cpu().numpy()
+        qs = self.inference(state)
         # Take the best action
         action = np.argmax(qs)
-        del state
 
         # Take the best action
         if random() < self.epsilon:
@@ -113,50 +186,34 @@ class DQNAgent:
 
     def preprocess(self, x):
         """
-            Prepare the raw states for a DQN forward pass
+            Prepare the raw states (uint8 numpy arrays or tensors) for a DQN forward pass
         """
-        # Normalize the values
-        x = torch.tensor(x, device=device, dtype=torch.float) / 255
+        # The states are moved to the device as uint8 and normalized there
+        x = torch.as_tensor(x).to(device, non_blocking=True).float() / 255
         # Assert that the batch dimension is respected
         if len(x.shape) < 4:
             x = x.unsqueeze(0)
         return x
 
-    def train_step(self, states, actions, rewards, dones):
+    def train_step(self, replay_buffer):
         """
-            Perform a training step using the given replay buffer
+            Perform a training step using the given replay buffer (or BatchPrefetcher). Return wether the step was performed
         """
         tstart = time.time()
         # We want to train only if we have enough data and respecting the "min_buff_size" hyperparameter
-        if len(states) < max(self.hyperparameters["min_buff_size"], self.hyperparameters["batch_size"]):
-            return
-        # Sample from the replay buffer
-        idxs = np.random.randint(0, len(states) - 1, self.hyperparameters["batch_size"])
-        # Gather the data of the batch
-        s = []
-        sprime = []
-        a = []
-        r = []
-        d = []
-        for i in idxs:
-            s.append(states[i])
-            sprime.append(states[i+1])
-            a.append(actions[i])
-            r.append(rewards[i])
-            d.append(dones[i])
-
-        # List to numpy array / stacking
-        s = np.stack(s, axis=0)
-        sprime = np.stack(sprime, axis=0)
-        a = np.expand_dims(np.array(a), axis=-1)
-        r = np.array(r)
-        d = np.array(d)
+        if len(replay_buffer) < max(self.hyperparameters["min_buff_size"], self.hyperparameters["batch_size"]):
+            return False
+        # Sample and gather the data of the batch from the replay buffer
+        s, a, r, sprime, d, weights, idxs = replay_buffer.sample(self.hyperparameters["batch_size"])
+        a = np.expand_dims(a, axis=-1)
 
         # Preprocess the batch + to pytorch tensors
         s = self.preprocess(s)
         sprime = self.preprocess(sprime)
         a = torch.tensor(a, dtype=torch.long, device=device)
         r = torch.tensor(r, dtype=torch.float, device=device)
+        # Importance-sampling weights of the prioritized replay (all 1 with uniform sampling)
+        weights = torch.tensor(weights, dtype=torch.float, device=device)
 
         q_t = self.policy(s).gather(1, a)
 
@@ -169,33 +226,36 @@ class DQNAgent:
         self.policy.train()
         q_t_prime = self.target(sprime).gather(1, aprime).squeeze(-1)
         # The Q' estimation is 0 if the state was terminal
-        q_t_prime[d] = 0
+        q_t_prime[torch.from_numpy(d).to(device)] = 0
 
         # Calculate the final estimation of the Q-value
         q_t_estim = r + (q_t_prime * self.hyperparameters["reward_discount_factor"])
 
-        # Huber Loss variant
-        criterion = nn.SmoothL1Loss()
-        loss = criterion(q_t, q_t_estim.unsqueeze(1))
+        # Huber Loss variant, weighted by the importance-sampling weights
+        criterion = nn.SmoothL1Loss(reduction='none')
+        loss = (criterion(q_t, q_t_estim.unsqueeze(1)).squeeze(1) * weights).mean()
         # Perform the gradient descent
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
         self.n_steps += 1
+        # The TD errors are the new priorities of the sampled transitions
+        replay_buffer.updatePriorities(idxs, (q_t_estim - q_t.squeeze(1)).detach().abs().cpu().numpy())
         # Update the target and backup when it's time to
         if self.n_steps % self.hyperparameters["target_frequency_update"] == 0:
-            torch.save(deepcopy(self.policy).cpu(), self.model_save_path + "/target.pt")
+            self.saveModel(self.policy, "target.pt")
             print("Updating target...")
             self.target.load_state_dict(self.policy.state_dict())
 
         # Memory management
-        del a, r, q_t, q_t_prime, q_t_estim
+        del a, r, weights, q_t, q_t_prime, q_t_estim
+        return True
 
     def setState(self, state):
-        self.policy = torch.load(state["policy_model"]).to(device)
+        self.policy = self.loadModel(state["policy_model"])
         # Target network
         if os.path.isfile(state["target_model"]):
-            self.target = torch.load(state["target_model"]).to(device)
+            self.target = self.loadModel(state["target_model"])
         else:
             self.target = DQN(config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH, self.n_actions).to(device)
             self.target.load_state_dict(self.policy.state_dict())
@@ -205,17 +265,25 @@ class DQNAgent:
         self.optimizer.load_state_dict(torch.load(state["optimizer"]))
         self.n_steps = state["n_steps"]
         self.epsilon = state["epsilon"]
+        self.saved_steps = {}
+        self.inference.load(self.policy)
+        self.inference_steps = self.n_steps
 
     def getState(self):
         """
-            Return the internal state of the wrapper for backup 
+            Return the internal state of the wrapper for backup. The models are snapshotted here and written by the background writer
         """
-        torch.save(deepcopy(self.policy).cpu(), os.path.join(self.model_save_path, "policy.pt"))
-        torch.save(self.optimizer.state_dict(), os.path.join(self.model_save_path, "optimizer.pt"))
+        # Snapshot of the models so that the training can go on while they are written
+        with self.lock:
+            policy_path = self.saveModel(self.policy, "policy.pt")
+            optimizer_path = os.path.join(self.model_save_path, "optimizer.pt")
+            if self.saved_steps.get(optimizer_path) != self.n_steps:
+                self.saved_steps[optimizer_path] = self.n_steps
+                self.writer.submit(atomicSave, optimizer_path, partial(torch.save, deepcopy(self.optimizer.state_dict())))
         return {
-            "policy_model": os.path.join(self.model_save_path, "policy.pt"),
+            "policy_model": policy_path,
             "target_model": os.path.join(self.model_save_path, "target.pt"),
-            "optimizer": os.path.join(self.model_save_path, "optimizer.pt"),
+            "optimizer": optimizer_path,
             "n_steps": self.n_steps,
             "epsilon": self.epsilon
         }
\ No newline at end of file
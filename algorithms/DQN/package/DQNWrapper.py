@@ -10,16 +10,26 @@ import config
 import time
 import json
 import os
-
+from functools import partial
 from collections import deque
+
 # Here you can also import from the package folder
 from package.DQNAgent import DQNAgent
+from package.ReplayBuffer import ReplayBuffer
+from package.FrameReplayBuffer import FrameReplayBuffer
+from package.Learner import Learner
+from package.BatchPrefetcher import BatchPrefetcher
+from package.ReplayChunkBackup import ReplayChunkBackup
 # And from the core of the library
 from core.Telemetry import Telemetry
+from core.TelemetryRollup import TelemetryRollup
 # And also utility functions
 from utils.draw import SplittedLayoutWindow
+from utils.BackgroundWriter import BackgroundWriter, atomicSave
 
 EPISODE_SAVE_FREQUENCY = 50
+REPLAY_BUFFER_DIRECTORY = "replay_buffer"
+REPLAY_CHUNKS_DIRECTORY = "replay_chunks"
 
 class DQNWrapper:
     """
@@ -27,31 +37,86 @@ class DQNWrapper:
     """
     def __init__(self, n_actions, hyperparameters, source_file=None):
         self.hyperparameters = hyperparameters
-        self.agent = DQNAgent(n_actions, hyperparameters)
+        # Backups are written by a background thread so the training never waits for the disk
+        self.writer = BackgroundWriter()
+        self.agent = DQNAgent(n_actions, hyperparameters, writer=self.writer)
         self.game_steps = 0
         self.tstart = time.time()
         self.initial_duration = 0
         self.n_finish = 0
         self.n_episode = 0
-        # Replay buffer
-        self.frames = deque(maxlen=self.hyperparameters["buffer_size"])
-        self.actions = deque(maxlen=self.hyperparameters["buffer_size"])
-        self.rewards = deque(maxlen=self.hyperparameters["buffer_size"])
-        self.dones = deque(maxlen=self.hyperparameters["buffer_size"])
+        # Replay buffer. "frames" storage keeps each captured frame once, "states" storage keeps the full states
+        # With "replay_memmap" the buffer lives in memory-mapped files of the experiment folder instead of the RAM
+        # With "prioritized_replay" the transitions with high TD errors are sampled more often
+        replay_params = {
+            "directory": REPLAY_BUFFER_DIRECTORY if self.hyperparameters.get("replay_memmap", False) else None
+        }
+        if self.hyperparameters.get("prioritized_replay", False):
+            replay_params["priority_alpha"] = self.hyperparameters["priority_alpha"]
+            replay_params["priority_beta"] = self.hyperparameters["priority_beta"]
+            replay_params["priority_beta_steps"] = self.hyperparameters["priority_beta_steps"]
+        if self.hyperparameters.get("replay_storage", "states") == "frames":
+            self.replay_buffer = FrameReplayBuffer(
+                self.hyperparameters["buffer_size"],
+                frame_capacity=self.hyperparameters.get("replay_frame_capacity", None),
+                **replay_params
+            )
+        else:
+            self.replay_buffer = ReplayBuffer(self.hyperparameters["buffer_size"], **replay_params)
+        # With "prefetch_batches" the next minibatches are sampled in a background thread while the current one trains
+        self.prefetcher = None
+        self.batch_source = self.replay_buffer
+        if self.hyperparameters.get("prefetch_batches", 0) > 0:
+            self.prefetcher = BatchPrefetcher(
+                self.replay_buffer,
+                self.hyperparameters["batch_size"],
+                max(self.hyperparameters["min_buff_size"], self.hyperparameters["batch_size"]),
+                self.hyperparameters["prefetch_batches"]
+            )
+            self.batch_source = self.prefetcher
+        # With "learner_thread" the training runs continuously in a background thread instead of the waiting phase of the environment
+        self.learner = None
+        if self.hyperparameters.get("learner_thread", False) and self.hyperparameters.get("adaptive_training", False):
+            # The learner trains in its own thread, the time budget of the waiting phase can't control it
+            raise Exception("The \"adaptive_training\" and \"learner_thread\" hyperparameters can't be enabled together")
+        if self.hyperparameters.get("learner_thread", False):
+            self.learner = Learner(
+                self.agent,
+                self.replay_buffer,
+                self.hyperparameters.get("policy_publish_interval", 100),
+                self.hyperparameters["train_every"],
+                self.batch_source
+            )
+        # (time, number of training steps) of the last second, to measure the training throughput
+        self.train_steps_history = deque()
+        # Running estimate of the duration of a training step, and number of training steps run during the last env step
+        self.train_step_cost = None
+        self.last_n_train_steps = 0
+        # Incremental backups of the replay buffer when it isn't memory-mapped
+        self.replay_chunks = ReplayChunkBackup(self.replay_buffer, REPLAY_CHUNKS_DIRECTORY, self.writer)
         # Metrics to Track and/or display
         self.telemetry = Telemetry([
             "Duration",
             "FPS",
             "Action Latency",
+            "Inference Latency",
             "Episode",
             "Env step",
             "Train step",
+            "Train steps/s",
+            "Train steps/Env step",
+            "Prefetch Starvation",
             "Finish",
             "Reward",
             "Q-value",
             "Epsilon",
             "Action",
             "Episode Reward"
+        ], format=hyperparameters.get("telemetry_format", "csv"), rollups=[
+            # Summaries of the metrics per episode, per minute and per 1000 env steps (metrics_<name>.csv)
+            TelemetryRollup("episode", "Episode"),
+            TelemetryRollup("minute", width=60),
+            TelemetryRollup("1k_steps", "Env step", 1000)
         ])
         # Utility to display a window with a splitted layout. The window will be splitted in 4x3 sections. We provide our telemetry so it is used as a data source
         self.ui = SplittedLayoutWindow(self.telemetry, (4, 3))
@@ -96,7 +161,7 @@ class DQNWrapper:
         self.ui.bind(11, "Episode Reward", 'graphic', {"maxlen": 30, "approx_type": 'moving_average'})
 
     def backupExists(self):
-        return os.path.isfile('./actions_buffer.npy')
+        return os.path.isfile('./state_backup.json')
 
     def loadBackup(self):
         with open('./state_backup.json') as f:
@@ -110,34 +175,29 @@ class DQNWrapper:
         self.n_finish = state["n_finish"]
         self.n_episode = state["n_episode"]
 
-        # Replay buffer
-        self.frames = deque(np.load(state["frames"]), maxlen=self.hyperparameters["buffer_size"])
-        self.actions = deque(np.load(state["actions"]), maxlen=self.hyperparameters["buffer_size"])
-        self.rewards = deque(np.load(state["rewards"]), maxlen=self.hyperparameters["buffer_size"])
-        self.dones = deque(np.load(state["dones"]), maxlen=self.hyperparameters["buffer_size"])
+        # Replay buffer. Memory-mapped buffers are simply reopened, the others are rebuilt from their chunks
+        if "replay_buffer" in state:
+            self.replay_buffer.reopen()
+        elif "replay_chunks" in state:
+            self.replay_chunks.load(state["replay_chunks"])
+        else:
+            self.replay_buffer.load(state)
 
     def getState(self):
         """
-            Return a dictionnary representing the state of the algorithm. Used for backups
+            Return a dictionnary representing the state of the algorithm. Used for backups.
+            The data is copied in memory, the files are written by the background writer
         """
-        tstart = time.time()
-        frames_path = "frames_buffer.npy"
-        actions_path = "actions_buffer.npy"
-        rewards_path = "rewards_buffer.npy"
-        dones_path = "dones_buffer.npy"
-
-        buffer_tstart = time.time()
-        np.save(frames_path, np.stack(self.frames, axis=0))
-        np.save(actions_path, np.array(self.actions))
-        np.save(rewards_path, np.array(self.rewards))
-        np.save(dones_path, np.array(self.dones))
-        buffer_saving_time = time.time() - buffer_tstart
-
-        agent_tstart = time.time()
-        agent_state = self.agent.getState()
-        agent_saving_time = time.time() - agent_tstart
+        if self.replay_buffer.directory is not None:
+            # The memory-mapped files already hold the buffer, they only need to be flushed
+            self.writer.submit(self.replay_buffer.flush)
+            buffer_paths = {"replay_buffer": self.replay_buffer.directory}
+        else:
+            # Only the transitions added since the previous backup are written, in a new chunk file
+            buffer_paths = {"replay_chunks": self.replay_chunks.save()}
 
-        telemetry_state = self.telemetry.getState()
+        agent_state = self.agent.getState()
+        telemetry_state = self.telemetry.getState(self.writer)
 
         state = {
             "agent": agent_state,
@@ -146,10 +206,7 @@ class DQNWrapper:
             "duration": time.time() - self.tstart + self.initial_duration,
             "n_finish": self.n_finish,
             "n_episode": self.n_episode,
-            "frames": frames_path,
-            "actions": actions_path,
-            "rewards": rewards_path,
-            "dones": dones_path,
+            **buffer_paths
         }
         
         return state
@@ -157,21 +214,67 @@ class DQNWrapper:
     def saveState(self):
         """
             Save the current state of the algorithm in the "state_backup.json" file.
-            Warning: Take a long time if the buffer is big
+            Doesn't wait for the disk: the files are written in the background and "state_backup.json" is replaced once they are all written
         """
-        with open('state_backup.json', 'w') as f:
-            json.dump(self.getState(), f)
-        print("Backup complete !")
+        tstart = time.time()
+        state = self.getState()
+        self.writer.submit(atomicSave, 'state_backup.json', partial(json.dump, state), 'w')
+        # The chunks the new backup doesn't reference are deleted once it is written
+        self.replay_chunks.removeObsolete()
+        print("Backup scheduled in {:.3f}s".format(time.time() - tstart))
 
-    def update(self):
+    def update(self, budget=None):
         """
             Here are the function to perform each step that takes time. It's wrapped in this function so it can be called during the waiting phase of the environment
+
+            params:
+                budget: Time left before the next tick of the environment in seconds. If given, as many training steps as fit in it are run
+                        instead of one every "train_every" env steps
         """
-        # Training step
-        if self.game_steps % self.hyperparameters["train_every"] == 0:
-            self.agent.train_step(self.frames, self.actions, self.rewards, self.dones)
+        tstart = time.perf_counter()
         if not self.ui.draw():
             raise Exception("Graphic mode Interuption")
+        # Training steps, unless the learner trains in its own thread
+        if self.learner is not None:
+            self.learner.raiseError()
+        elif budget is None:
+            trained = self.game_steps % self.hyperparameters["train_every"] == 0 and self.agent.train_step(self.batch_source)
+            self.last_n_train_steps = int(trained)
+        else:
+            self.trainWithinBudget(tstart + budget)
+        if self.learner is None:
+            # Give the new weights to play now rather than between the state and the action
+            self.agent.syncPolicy()
+
+    def trainWithinBudget(self, deadline):
+        """
+            Run training steps until the next one would end after "deadline" (perf_counter time).
+            To keep training when the steps don't fit in the budget, one step is still run every "train_every" env steps
+        """
+        n_train_steps = 0
+        while True:
+            t = time.perf_counter()
+            if self.train_step_cost is not None and t + self.train_step_cost > deadline:
+                if n_train_steps > 0 or self.game_steps % self.hyperparameters["train_every"] != 0:
+                    break
+            if not self.agent.train_step(self.batch_source):
+                # Not enough transitions in the replay buffer yet
+                break
+            n_train_steps += 1
+            # Exponential moving average of the duration of the training steps
+            duration = time.perf_counter() - t
+            self.train_step_cost = duration if self.train_step_cost is None else 0.9 * self.train_step_cost + 0.1 * duration
+        self.last_n_train_steps = n_train_steps
+
+    def getTrainStepsPerSecond(self):
+        """
+            Return the number of training steps performed during the last second
+        """
+        t = time.time()
+        self.train_steps_history.append((t, self.agent.getTrainSteps()))
+        while t - self.train_steps_history[0][0] > 1:
+            self.train_steps_history.popleft()
+        return self.train_steps_history[-1][1] - self.train_steps_history[0][1]
 
     def run(self, tmenv):
         """
@@ -183,7 +286,11 @@ class DQNWrapper:
         # Save the time at start to keep track of the duration of execution
         self.tstart = time.time()
         # Attach the update function to the hook provided by the environment. This function will be called during the waiting phase
-        tmenv.attachToWaitHook(self.update)
+        tmenv.attachToWaitHook(self.update, with_budget=self.hyperparameters.get("adaptive_training", False))
+        if self.prefetcher is not None:
+            self.prefetcher.start()
+        if self.learner is not None:
+            self.learner.start()
         # Episodes loop
         for i in range(self.n_episode, self.hyperparameters["n_episodes"]):
             print("Starting new episode")
@@ -199,26 +306,28 @@ class DQNWrapper:
                 # The agent select an action
                 action = self.agent.play(state)
                 # Give this action to the enironment so that it can respond with the new state, observed rewards, wether the state is terminal, and a few more informations
-                state, reward, done, info = tmenv.step(action)
+                next_state, reward, done, info = tmenv.step(action)
                 # Save the performed action because it can be different from the action the agent took (if a human overridden the agent's action using a physical device)
                 performed_action = info["performed_action"]
                 # Count the number of times the agent finished the track
                 if info["is_finished"]:
                     self.n_finish += 1
-                # Save state, action, reward, done in the replay buffer
-                self.frames.append(state)
-                self.actions.append(performed_action)
-                self.rewards.append(reward)
-                self.dones.append(done)
+                # Save the state in which the action was taken, the action, reward and done in the replay buffer
+                self.replay_buffer.add(state, performed_action, reward, done)
+                state = next_state
                 self.total_rewards += reward
                 # Update the telemetry with the current values
                 self.telemetry.append({
                     "Duration": time.time() - self.tstart + self.initial_duration,
                     "FPS": tmenv.getFPS(),
                     "Action Latency": info["action_latency"],
+                    "Inference Latency": self.agent.getInferenceLatency(),
                     "Episode": self.n_episode,
                     "Env step": self.game_steps,
                     "Train step": self.agent.getTrainSteps(),
+                    "Train steps/s": self.getTrainStepsPerSecond(),
+                    "Train steps/Env step": self.last_n_train_steps,
+                    "Prefetch Starvation": self.prefetcher.getStarvation() if self.prefetcher is not None else np.NaN,
                     "Finish": self.n_finish,
                     "Reward": reward,
                     "Q-value": self.agent.getLastQValue(),
@@ -242,3 +351,11 @@ class DQNWrapper:
             
             # Some loging to debug
             print("Finished ! Obtained {} rewards".format(self.total_rewards))
+
+        if self.learner is not None:
+            self.learner.stop()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        # Wait for the backups and the telemetry still being written
+        self.writer.close()
+        self.telemetry.close()
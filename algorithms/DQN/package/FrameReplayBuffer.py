@@ -0,0 +1,219 @@
+"""
+
+    Replay buffer for the DQN algorithm storing each captured frame once.
+    Consecutive states share all their frames but one, so the states are rebuilt from a ring of frames when sampled
+
+"""
+
+import numpy as np
+import config
+
+from package.ReplayBuffer import ReplayBuffer
+
+class FrameReplayBuffer(ReplayBuffer):
+    """
+        Replay buffer storing each frame once and the time left as a scalar.
+        A transition keeps the ids of its frames in a ring of frames. The frames of a new state are compared with the frames
+        of the previous one so the deduplication is lossless. Transitions whose frames were overwritten are evicted.
+    """
+    SAVED_FIELDS = ("frames", "frame_ids", "time_left", "actions", "rewards", "dones")
+    COUNTERS = ("cursor", "size", "n_added", "n_written_frames")
+
+    def __init__(self, capacity, n_frames=config.CAPTURE_N_FRAMES, include_time_left=True, frame_capacity=None, directory=None,
+            priority_alpha=None, priority_beta=0.4, priority_beta_steps=100000):
+        """
+            params:
+                capacity: Max number of transitions kept. The oldest ones are overwritten
+                n_frames: Number of frames in a state
+                include_time_left (boolean): Wether the states start with the time left plane (see TMEnv.getObservation)
+                frame_capacity: Number of frames kept. By default there is room for n_frames new frames per transition, so that
+                                no transition is evicted even when consecutive states don't share any frame. A smaller ring
+                                saves memory when they do, at the cost of evicting transitions when it's full
+                directory: If given, the arrays are np.memmap files in this directory (see ReplayBuffer)
+                priority_alpha, priority_beta, priority_beta_steps: Prioritized replay parameters (see ReplayBuffer)
+        """
+        super().__init__(capacity, directory, priority_alpha, priority_beta, priority_beta_steps)
+        self.n_frames = n_frames
+        self.include_time_left = include_time_left
+        self.n_planes = n_frames + 1 if include_time_left else n_frames
+        self.frame_capacity = frame_capacity if frame_capacity is not None else capacity * n_frames + n_frames
+        self.frames = None
+        self.frame_ids = None
+        self.time_left = None
+        # Number of frames written since the creation of the buffer. The id of a frame is its writing order
+        self.n_written_frames = 0
+        # Ids of the frames of the last added state
+        self.previous_ids = None
+        # Number of transitions evicted because their frames were overwritten
+        self.n_evicted = 0
+
+    def allocateStates(self, state_shape):
+        """
+            Allocate the ring of frames, the frame ids and the time left of the transitions
+        """
+        self.frame_shape = tuple(state_shape[1:])
+        self.frames = self.allocate("frames", (self.frame_capacity,) + self.frame_shape, np.uint8)
+        self.frame_ids = self.allocate("frame_ids", (self.capacity, self.n_frames), np.int64)
+        self.time_left = self.allocate("time_left", (self.capacity,), np.uint8)
+
+    def isFrameStored(self, frame_id):
+        """
+            Return wether the frame "frame_id" is still in the ring of frames
+        """
+        return frame_id >= self.n_written_frames - self.frame_capacity
+
+    def findFrame(self, frame, candidates):
+        """
+            Return the id of a stored frame equal to "frame" among the candidates ids, None if there isn't any
+        """
+        for frame_id in candidates:
+            if self.isFrameStored(frame_id) and np.array_equal(self.frames[frame_id % self.frame_capacity], frame):
+                return frame_id
+        return None
+
+    def storeState(self, i, state):
+        """
+            Store the frames of the state that aren't already in the previous state, and the time left as a scalar
+        """
+        ids = np.empty(self.n_frames, dtype=np.int64)
+        for k, frame in enumerate(state[self.n_planes - self.n_frames:]):
+            # Most of the time frame k of the state is frame k + 1 of the previous one
+            candidates = list(ids[:k])
+            if self.previous_ids is not None:
+                candidates = list(self.previous_ids[k + 1:]) + list(self.previous_ids[:k + 1]) + candidates
+            frame_id = self.findFrame(frame, candidates)
+            if frame_id is None:
+                frame_id = self.n_written_frames
+                self.frames[frame_id % self.frame_capacity] = frame
+                self.n_written_frames += 1
+            ids[k] = frame_id
+        self.frame_ids[i] = ids
+        if self.include_time_left:
+            self.time_left[i] = state[0].flat[0]
+        self.previous_ids = ids
+
+    def getStates(self, idxs):
+        """
+            Rebuild the states of the transitions at the given positions
+        """
+        states = np.empty((len(idxs), self.n_planes) + self.frame_shape, dtype=np.uint8)
+        states[:, self.n_planes - self.n_frames:] = self.frames[self.frame_ids[idxs] % self.frame_capacity]
+        if self.include_time_left:
+            states[:, 0] = self.time_left[idxs].reshape((-1,) + (1,) * len(self.frame_shape))
+        return states
+
+    def insert(self, state, action, reward, done):
+        """
+            Add a transition without taking the lock, then evict the transitions whose frames were overwritten
+        """
+        super().insert(state, action, reward, done)
+        self.evictStale()
+        self.syncCounters()
+
+    def evictStale(self):
+        """
+            Remove the oldest transitions whose frames were overwritten.
+            The frames of a transition are never older than the ones of the previous transition so only the oldest ones need to be checked
+        """
+        while self.size > 0 and not self.isFrameStored(self.frame_ids[self.getOldestIndex()].min()):
+            self.dropOldest()
+            if self.n_evicted == 0:
+                print("The ring of frames of the replay buffer is full, the transitions whose frames are overwritten are evicted "
+                      "so the buffer holds less than {} transitions".format(self.capacity))
+            self.n_evicted += 1
+
+    def save(self, paths):
+        """
+            Save the transitions in the .npy files given by "paths" (dict with the keys of SAVED_FIELDS).
+            Only the frames used by the transitions are saved, their ids start at 0
+        """
+        if self.actions is None or self.size == 0:
+            return
+        frame_ids = self.getOrdered(self.frame_ids)
+        first_id = frame_ids.min()
+        np.save(paths["frames"], self.frames[np.arange(first_id, self.n_written_frames) % self.frame_capacity])
+        np.save(paths["frame_ids"], frame_ids - first_id)
+        np.save(paths["time_left"], self.getOrdered(self.time_left))
+        self.saveTransitions(paths)
+
+    def load(self, paths):
+        """
+            Load the transitions saved by save. Only the newest "capacity" transitions are kept.
+            Backups saved by ReplayBuffer are converted by adding their states one by one
+        """
+        frames = np.load(paths["frames"])
+        if "frame_ids" not in paths:
+            self.loadStates(frames, paths)
+            return
+        frame_ids = np.load(paths["frame_ids"])[-self.capacity:]
+        n = len(frame_ids)
+        self.allocateAll((self.n_planes,) + frames.shape[1:])
+        # Frames are put back at the position given by their id
+        first_id = max(len(frames) - self.frame_capacity, 0)
+        self.frames[np.arange(first_id, len(frames)) % self.frame_capacity] = frames[first_id:]
+        self.n_written_frames = len(frames)
+        self.frame_ids[:n] = frame_ids
+        time_left = np.load(paths["time_left"])
+        self.time_left[:n] = time_left[len(time_left) - n:]
+        self.loadTransitions(paths, n)
+        self.size = n
+        self.cursor = n % self.capacity
+        self.n_added = n
+        self.previous_ids = None
+        self.resetPriorities()
+        self.evictStale()
+        self.syncCounters()
+
+    def reopen(self):
+        """
+            Reopen the memory-mapped files of the directory
+        """
+        super().reopen()
+        self.previous_ids = None
+
+    def loadStates(self, states, paths):
+        """
+            Load a backup saved by ReplayBuffer (full states)
+        """
+        n = min(len(states), self.capacity)
+        actions, rewards, dones = (np.load(paths[name])[-n:] for name in ("actions", "rewards", "dones"))
+        for state, action, reward, done in zip(states[-n:], actions, rewards, dones):
+            self.add(state, action, reward, done)
+        self.previous_ids = None
+
+    def getStatesChunk(self, positions):
+        """
+            Return a copy of the frames used by the transitions at the given positions, their ids and the time left.
+            The frames shared with the previous chunk are included so every chunk can be loaded on its own
+        """
+        frame_ids = self.frame_ids[positions]
+        first_id = frame_ids.min() if len(positions) > 0 else self.n_written_frames
+        return {
+            "frames": self.frames[np.arange(first_id, self.n_written_frames) % self.frame_capacity],
+            "first_frame_id": np.array(first_id),
+            "frame_ids": frame_ids,
+            "time_left": self.time_left[positions]
+        }
+
+    def loadStatesChunk(self, chunk, positions, skip):
+        """
+            Store the frames of a chunk at the position given by their id, then the frame ids and time left of the transitions
+        """
+        frames = chunk["frames"]
+        frame_ids = int(chunk["first_frame_id"]) + np.arange(len(frames))
+        # Only the newest "frame_capacity" frames fit in the ring
+        keep = max(len(frames) - self.frame_capacity, 0)
+        self.frames[frame_ids[keep:] % self.frame_capacity] = frames[keep:]
+        if len(frames) > 0:
+            self.n_written_frames = max(self.n_written_frames, int(frame_ids[-1]) + 1)
+        self.frame_ids[positions] = chunk["frame_ids"][skip:]
+        self.time_left[positions] = chunk["time_left"][skip:]
+
+    def loadChunk(self, chunk):
+        """
+            Append the transitions of a chunk returned by getChunk. The chunks must be loaded in order
+        """
+        super().loadChunk(chunk)
+        self.previous_ids = None
+        self.evictStale()
+        self.syncCounters()
@@ -0,0 +1,79 @@
+"""
+
+    Inference engine for the DQN agent. Evaluates the policy on single states with as little overhead as possible
+
+"""
+
+import threading
+import torch
+from copy import deepcopy
+
+from core.StepProfiler import StepProfiler
+
+class InferenceEngine:
+    """
+        Runs an eval-mode copy of a model under torch.inference_mode. The uint8 states are copied into preallocated input tensors.
+        The engine holds two copies of the model: load writes the new weights in the one that isn't used and then swaps them,
+        so that the weights can be updated from another thread (see Learner)
+    """
+    def __init__(self, model, input_shape, device, trace=False):
+        """
+            params:
+                model: Pytorch model to evaluate
+                input_shape: Shape of a state (without the batch dimension)
+                device: Device on which the model runs
+                trace (boolean): Wether the copies of the model should be compiled with TorchScript tracing
+        """
+        self.device = device
+        self.profiler = StepProfiler()
+        with torch.inference_mode():
+            # Inference tensors can only be used in inference mode, that's all we need
+            self.input_uint8 = torch.empty((1,) + tuple(input_shape), dtype=torch.uint8, device=device)
+            self.input = torch.empty((1,) + tuple(input_shape), dtype=torch.float, device=device)
+        self.models = [self.makeCopy(model, trace), self.makeCopy(model, trace)]
+        # Held while the model is evaluated and while the copies are swapped
+        self.lock = threading.Lock()
+
+    def makeCopy(self, model, trace):
+        """
+            Return an eval-mode copy of the model that doesn't track gradients
+        """
+        copy = deepcopy(model).to(self.device).eval()
+        for parameter in copy.parameters():
+            parameter.requires_grad_(False)
+        if trace:
+            with torch.no_grad():
+                copy = torch.jit.trace(copy, torch.zeros(self.input.shape, device=self.device))
+        return copy
+
+    def load(self, model):
+        """
+            Copy the weights of "model" into the engine
+        """
+        self.models[1].load_state_dict(model.state_dict())
+        with self.lock:
+            self.models.reverse()
+
+    def __call__(self, state):
+        """
+            Return the output of the model for a single uint8 state as a numpy array
+        """
+        self.profiler.start()
+        with self.lock, torch.inference_mode():
+            self.input_uint8.copy_(torch.from_numpy(state))
+            self.input.copy_(self.input_uint8).div_(255)
+            output = self.models[0](self.input)[0].cpu().numpy()
+        self.profiler.mark("inference")
+        return output
+
+    def getLastLatency(self):
+        """
+            Return the duration of the last call in seconds
+        """
+        return self.profiler.getLast().get("inference", 0)
+
+    def getLatencyPercentiles(self, percentiles=(50, 95, 99)):
+        """
+            Return the given percentiles of the duration of the last calls in seconds
+        """
+        return self.profiler.getPercentiles("inference", percentiles)
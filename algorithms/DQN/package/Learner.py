@@ -0,0 +1,80 @@
+"""
+
+    Learner of the DQN algorithm. Trains the agent continuously in a background thread, independently from the environment's steps
+
+"""
+
+import threading
+
+class Learner:
+    """
+        Trains the agent from the shared replay buffer in a background thread.
+        Like the synchronous training, one training step is run every "train_every" transitions added by the actor:
+        the learner waits for new transitions instead of training as fast as it can, so the replay ratio doesn't depend on the machine.
+        Every "publish_interval" training steps, the policy used by the actor is replaced by a snapshot of the trained one
+    """
+    def __init__(self, agent, replay_buffer, publish_interval=100, train_every=1, batch_source=None):
+        """
+            params:
+                agent: DQNAgent to train
+                replay_buffer: Replay buffer filled by the actor
+                publish_interval: Number of training steps between two policy snapshots
+                train_every: Number of transitions added to the replay buffer per training step
+                batch_source: Where the minibatches are sampled (e.g. BatchPrefetcher). Default to the replay buffer
+        """
+        self.agent = agent
+        self.replay_buffer = replay_buffer
+        self.batch_source = batch_source if batch_source is not None else replay_buffer
+        self.publish_interval = publish_interval
+        self.train_every = train_every
+        # Number of added transitions already used to allow training steps
+        self.consumed = 0
+        self._running = False
+        self._error = None
+        self._thread = None
+
+    def start(self):
+        """
+            Start training in the background thread
+        """
+        self.agent.publishPolicy()
+        self.consumed = self.replay_buffer.n_added
+        self._running = True
+        self._thread = threading.Thread(target=self._train, daemon=True)
+        self._thread.start()
+
+    def _train(self):
+        try:
+            while self._running:
+                # Wait until the actor added "train_every" transitions since the previous training step
+                with self.replay_buffer.new_transition:
+                    if not self.replay_buffer.new_transition.wait_for(
+                            lambda: self.replay_buffer.n_added - self.consumed >= self.train_every or not self._running,
+                            timeout=0.1
+                        ) or not self._running:
+                        continue
+                # Like the synchronous training, the allowance is used even when the replay buffer is still too small
+                self.consumed += self.train_every
+                with self.agent.lock:
+                    trained = self.agent.train_step(self.batch_source)
+                if trained and self.agent.getTrainSteps() % self.publish_interval == 0:
+                    self.agent.publishPolicy()
+        except Exception as e:
+            self._error = e
+
+    def raiseError(self):
+        """
+            Raise the error that stopped the learner if there is one
+        """
+        if self._error is not None:
+            raise Exception("The learner failed") from self._error
+
+    def stop(self):
+        """
+            Stop the background thread
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.raiseError()
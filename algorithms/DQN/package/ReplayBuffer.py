@@ -0,0 +1,364 @@
+"""
+
+    Replay buffer for the DQN algorithm. Preallocated NumPy ring buffer with vectorized sampling.
+    The arrays can live in memory-mapped files so the capacity isn't limited by the RAM
+
+"""
+
+import json
+import os
+import threading
+import numpy as np
+
+from package.SumTree import SumTree
+
+# Added to the TD errors so that every transition keeps a chance to be sampled
+PRIORITY_EPSILON = 1e-5
+
+class ReplayBuffer:
+    """
+        Preallocated NumPy ring buffer storing the transitions (state, action, reward, done).
+        The next state of a transition is the state of the following one so each state is stored once.
+    """
+    # Fields written by save, they are the keys of the "paths" dictionnary
+    SAVED_FIELDS = ("frames", "actions", "rewards", "dones")
+    # Attributes kept up to date in the "counters" file of memory-mapped buffers
+    COUNTERS = ("cursor", "size", "n_added")
+
+    def __init__(self, capacity, directory=None, priority_alpha=None, priority_beta=0.4, priority_beta_steps=100000):
+        """
+            params:
+                capacity: Max number of transitions kept. The oldest ones are overwritten
+                directory: If given, the arrays are np.memmap .npy files in this directory instead of being in RAM.
+                           Sampling reads straight from the files, the OS page cache doing the caching
+                priority_alpha: If given, the transitions are sampled with a probability proportional to priority ** priority_alpha
+                                where the priority is their last TD error (prioritized replay). Otherwise they are sampled uniformly
+                priority_beta: Initial exponent of the importance-sampling weights correcting the bias of the prioritized replay
+                priority_beta_steps: Number of sampled batches over which priority_beta is increased up to 1
+        """
+        self.capacity = capacity
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        # Mode used to open the memory-mapped files: "w+" creates them, "r+" reopens them (see reopen)
+        self.memmap_mode = "w+"
+        self.counters = None
+        # Makes add and sample safe to call from different threads (e.g. actor and learner)
+        self.lock = threading.Lock()
+        # Notified when a transition is added, for the threads waiting for new transitions (see Learner)
+        self.new_transition = threading.Condition(self.lock)
+        # Prioritized replay. The new transitions get the highest priority seen so far
+        self.priorities = SumTree(capacity) if priority_alpha is not None else None
+        self.priority_alpha = priority_alpha
+        self.priority_beta = priority_beta
+        self.priority_beta_increment = (1 - priority_beta) / priority_beta_steps
+        self.max_priority = 1.0
+        # The arrays are allocated at the first insertion, when the shape of the states is known
+        self.states = None
+        self.actions = None
+        self.rewards = None
+        self.dones = None
+        # Position of the next insertion, number of transitions stored and number of transitions added since the creation of the buffer
+        self.cursor = 0
+        self.size = 0
+        self.n_added = 0
+
+    def __len__(self):
+        return self.size
+
+    def allocate(self, name, shape, dtype):
+        """
+            Return a zeroed array used to store the field "name" of the transitions.
+            Memory-mapped buffers return a np.memmap of the file "name".npy of their directory
+        """
+        if self.directory is None:
+            return np.zeros(shape, dtype=dtype)
+        path = os.path.join(self.directory, name + ".npy")
+        if self.memmap_mode == "w+":
+            return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        array = np.lib.format.open_memmap(path, mode="r+")
+        if array.shape != tuple(shape) or array.dtype != dtype:
+            raise Exception("{} has the shape {} instead of {}, was the replay buffer created with another capacity ?".format(path, array.shape, tuple(shape)))
+        return array
+
+    def allocateAll(self, state_shape):
+        """
+            Allocate the storage of every field
+        """
+        self.state_shape = tuple(int(d) for d in state_shape)
+        self.allocateStates(self.state_shape)
+        self.actions = self.allocate("actions", (self.capacity,), np.int64)
+        self.rewards = self.allocate("rewards", (self.capacity,), np.float32)
+        self.dones = self.allocate("dones", (self.capacity,), bool)
+        if self.directory is not None:
+            self.counters = self.allocate("counters", (len(self.COUNTERS),), np.int64)
+            if self.memmap_mode == "w+":
+                # The state shape is needed to reopen the files
+                with open(os.path.join(self.directory, "layout.json"), 'w') as f:
+                    json.dump({"state_shape": list(self.state_shape)}, f)
+
+    def allocateStates(self, state_shape):
+        """
+            Allocate the storage of the states
+        """
+        self.states = self.allocate("states", (self.capacity,) + tuple(state_shape), np.uint8)
+
+    def storeState(self, i, state):
+        """
+            Store the state of the transition at position i
+        """
+        self.states[i] = state
+
+    def getStates(self, idxs):
+        """
+            Return the states of the transitions at the given positions
+        """
+        return self.states[idxs]
+
+    def add(self, state, action, reward, done):
+        """
+            Add a transition. "state" is the state in which "action" was taken, "reward" and "done" are the result of the action
+        """
+        with self.lock:
+            self.insert(state, action, reward, done)
+            self.new_transition.notify_all()
+
+    def insert(self, state, action, reward, done):
+        """
+            Add a transition without taking the lock
+        """
+        if self.actions is None:
+            self.allocateAll(state.shape)
+        i = self.cursor
+        self.storeState(i, state)
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        self.cursor = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.n_added += 1
+        if self.priorities is not None:
+            # The newest transition can't be sampled until its next state is known, the previous one now can
+            if self.size > 1:
+                self.priorities.update([i, (i - 1) % self.capacity], [0, self.max_priority])
+            else:
+                self.priorities.update([i], [0])
+        self.syncCounters()
+
+    def dropOldest(self):
+        """
+            Remove the oldest transition
+        """
+        if self.priorities is not None:
+            self.priorities.update([self.getOldestIndex()], [0])
+        self.size -= 1
+
+    def resetPriorities(self):
+        """
+            Give the highest priority to every transition that can be sampled. Used when the transitions are loaded
+        """
+        if self.priorities is None:
+            return
+        priorities = np.zeros(self.capacity)
+        priorities[(self.getOldestIndex() + np.arange(max(self.size - 1, 0))) % self.capacity] = self.max_priority
+        self.priorities.setAll(priorities)
+
+    def syncCounters(self):
+        """
+            Write the counters in their memory-mapped file so that reopen restores the latest transitions
+        """
+        if self.counters is not None:
+            self.counters[:] = [getattr(self, name) for name in self.COUNTERS]
+
+    def reopen(self):
+        """
+            Reopen the memory-mapped files of the directory. Nothing is copied, the transitions are read from the files when sampled
+        """
+        if self.directory is None:
+            raise Exception("Only memory-mapped replay buffers can be reopened")
+        with open(os.path.join(self.directory, "layout.json")) as f:
+            layout = json.load(f)
+        self.memmap_mode = "r+"
+        try:
+            self.allocateAll(layout["state_shape"])
+        finally:
+            self.memmap_mode = "w+"
+        for name, value in zip(self.COUNTERS, self.counters):
+            setattr(self, name, int(value))
+        self.resetPriorities()
+
+    def flush(self):
+        """
+            Write the changes of the memory-mapped files to the disk
+        """
+        if self.directory is None or self.actions is None:
+            return
+        for array in vars(self).values():
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def getOldestIndex(self):
+        """
+            Return the position of the oldest transition
+        """
+        return (self.cursor - self.size) % self.capacity
+
+    def sampleIndices(self, batch_size):
+        """
+            Return the positions of "batch_size" transitions drawn uniformly.
+            The newest transition is excluded because its next state isn't known yet
+        """
+        offsets = np.random.randint(0, self.size - 1, batch_size)
+        return (self.getOldestIndex() + offsets) % self.capacity
+
+    def getBatch(self, idxs):
+        """
+            Gather the transitions at the given positions. Return the arrays s, a, r, s', done
+            The s' of a terminal transition belongs to the next episode, it must be ignored using done
+        """
+        next_idxs = (idxs + 1) % self.capacity
+        return self.getStates(idxs), self.actions[idxs], self.rewards[idxs], self.getStates(next_idxs), self.dones[idxs]
+
+    def samplePrioritizedIndices(self, batch_size):
+        """
+            Return the positions of "batch_size" transitions drawn proportionally to their priority, and their importance-sampling weights.
+            The sum of the priorities is split in "batch_size" segments and one transition is drawn in each of them
+        """
+        total = self.priorities.total()
+        values = (np.arange(batch_size) + np.random.rand(batch_size)) * total / batch_size
+        idxs = self.priorities.find(np.minimum(values, np.nextafter(total, 0)))
+        priorities = self.priorities.get(idxs)
+        # Rounding errors can lead to a transition that can't be sampled, those are replaced by uniformly drawn ones
+        empty = priorities <= 0
+        if empty.any():
+            idxs[empty] = self.sampleIndices(int(empty.sum()))
+            priorities[empty] = self.priorities.get(idxs[empty])
+        # The weights are normalized by the biggest one of the batch
+        weights = ((self.size - 1) * priorities / total) ** -self.priority_beta
+        self.priority_beta = min(self.priority_beta + self.priority_beta_increment, 1)
+        return idxs, (weights / weights.max()).astype(np.float32)
+
+    def sample(self, batch_size):
+        """
+            Return a batch of "batch_size" transitions: s, a, r, s', done, the importance-sampling weights and the positions of the transitions.
+            The weights are 1 when the transitions are drawn uniformly
+        """
+        with self.lock:
+            if self.priorities is None:
+                idxs, weights = self.sampleIndices(batch_size), np.ones(batch_size, dtype=np.float32)
+            else:
+                idxs, weights = self.samplePrioritizedIndices(batch_size)
+            return self.getBatch(idxs) + (weights, idxs)
+
+    def updatePriorities(self, idxs, td_errors):
+        """
+            Set the priorities of the transitions at the given positions from their TD errors. Does nothing without prioritized replay
+        """
+        if self.priorities is None:
+            return
+        priorities = (np.abs(td_errors) + PRIORITY_EPSILON) ** self.priority_alpha
+        with self.lock:
+            # Skip the transitions that left the buffer or became the newest one since they were sampled
+            valid = (idxs - self.getOldestIndex()) % self.capacity < self.size - 1
+            self.priorities.update(idxs[valid], priorities[valid])
+            self.max_priority = max(self.max_priority, priorities.max())
+
+    def getOrdered(self, array):
+        """
+            Return the stored part of the given field from the oldest to the newest transition
+        """
+        if self.getOldestIndex() == 0:
+            return array[:self.size]
+        return array[(self.getOldestIndex() + np.arange(self.size)) % self.capacity]
+
+    def save(self, paths):
+        """
+            Save the transitions in the .npy files given by "paths" (dict with the keys "frames", "actions", "rewards", "dones")
+        """
+        if self.actions is None:
+            return
+        np.save(paths["frames"], self.getOrdered(self.states))
+        self.saveTransitions(paths)
+
+    def saveTransitions(self, paths):
+        """
+            Save the actions, rewards and dones in the .npy files given by "paths"
+        """
+        np.save(paths["actions"], self.getOrdered(self.actions))
+        np.save(paths["rewards"], self.getOrdered(self.rewards))
+        np.save(paths["dones"], self.getOrdered(self.dones))
+
+    def load(self, paths):
+        """
+            Load the transitions saved by save. Only the newest "capacity" transitions are kept
+        """
+        if "frame_ids" in paths:
+            raise Exception("This backup was saved by a FrameReplayBuffer, set the \"replay_storage\" hyperparameter accordingly")
+        states = np.load(paths["frames"])[-self.capacity:]
+        self.allocateAll(states.shape[1:])
+        n = len(states)
+        self.states[:n] = states
+        self.loadTransitions(paths, n)
+        self.size = n
+        self.cursor = n % self.capacity
+        self.n_added = n
+        self.resetPriorities()
+        self.syncCounters()
+
+    def loadTransitions(self, paths, n):
+        """
+            Load the newest "n" actions, rewards and dones saved by saveTransitions at the beginning of the buffer
+        """
+        for array, name in ((self.actions, "actions"), (self.rewards, "rewards"), (self.dones, "dones")):
+            values = np.load(paths[name])
+            array[:n] = values[len(values) - n:]
+
+    def getChunk(self, start):
+        """
+            Return a copy of the transitions added since the "start"-th one that are still stored, as a dictionnary of arrays.
+            Used to write incremental backups: each chunk only holds the transitions added since the previous one
+        """
+        start = max(start, self.n_added - self.size)
+        positions = (self.cursor - (self.n_added - start) + np.arange(self.n_added - start)) % self.capacity
+        chunk = {
+            "start": np.array(start),
+            "state_shape": np.array(self.state_shape),
+            "actions": self.actions[positions],
+            "rewards": self.rewards[positions],
+            "dones": self.dones[positions]
+        }
+        chunk.update(self.getStatesChunk(positions))
+        return chunk
+
+    def getStatesChunk(self, positions):
+        """
+            Return a copy of the states of the transitions at the given positions, as a dictionnary of arrays
+        """
+        return {"states": self.states[positions]}
+
+    def loadChunk(self, chunk):
+        """
+            Append the transitions of a chunk returned by getChunk. The chunks must be loaded in order
+        """
+        if self.actions is None:
+            self.allocateAll(chunk["state_shape"])
+        n_transitions = len(chunk["actions"])
+        # Only the newest "capacity" transitions of the chunk fit in the buffer
+        skip = max(n_transitions - self.capacity, 0)
+        n = n_transitions - skip
+        positions = (self.cursor + np.arange(n)) % self.capacity
+        self.loadStatesChunk(chunk, positions, skip)
+        self.actions[positions] = chunk["actions"][skip:]
+        self.rewards[positions] = chunk["rewards"][skip:]
+        self.dones[positions] = chunk["dones"][skip:]
+        self.cursor = (self.cursor + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self.n_added = int(chunk["start"]) + n_transitions
+        self.resetPriorities()
+        self.syncCounters()
+
+    def loadStatesChunk(self, chunk, positions, skip):
+        """
+            Store the states of a chunk, except the "skip" first ones, at the given positions
+        """
+        self.states[positions] = chunk["states"][skip:]
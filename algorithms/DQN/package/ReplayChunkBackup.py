@@ -0,0 +1,71 @@
+"""
+
+    Incremental backup of a replay buffer in chunk files. Each backup only writes the transitions added since the previous one
+
+"""
+
+import os
+import numpy as np
+from functools import partial
+
+from utils.BackgroundWriter import atomicSave
+
+class ReplayChunkBackup:
+    """
+        Keep the list of the chunk files needed to rebuild a replay buffer.
+        A chunk is dropped from the list once all its transitions left the buffer, and its file is deleted once a backup
+        that doesn't reference it anymore is written
+    """
+    def __init__(self, replay_buffer, directory, writer):
+        """
+            params:
+                replay_buffer: ReplayBuffer to back up
+                directory: Directory of the chunk files
+                writer: BackgroundWriter writing the chunk files
+        """
+        self.replay_buffer = replay_buffer
+        self.directory = directory
+        self.writer = writer
+        os.makedirs(directory, exist_ok=True)
+        # Chunks of the last backup and number of transitions added to the replay buffer when it was made
+        self.chunks = []
+        self.checkpoint = 0
+        # Chunks dropped from the last backup, their files are deleted by removeObsolete
+        self.obsolete = []
+
+    def save(self):
+        """
+            Write the transitions added since the previous backup in a new chunk file (in the background).
+            Return the list of the chunks to reference in the new backup
+        """
+        # The chunks holding only transitions that left the replay buffer aren't needed by the new backup
+        oldest = self.replay_buffer.n_added - len(self.replay_buffer)
+        self.obsolete += [chunk for chunk in self.chunks if chunk["end"] <= oldest]
+        self.chunks = [chunk for chunk in self.chunks if chunk["end"] > oldest]
+        chunk = self.replay_buffer.getChunk(self.checkpoint)
+        if len(chunk["actions"]) > 0:
+            path = os.path.join(self.directory, "chunk_{:012d}.npz".format(int(chunk["start"])))
+            self.writer.submit(atomicSave, path, partial(np.savez, **chunk))
+            self.chunks.append({"path": path, "start": int(chunk["start"]), "end": self.replay_buffer.n_added})
+        self.checkpoint = self.replay_buffer.n_added
+        return list(self.chunks)
+
+    def removeObsolete(self):
+        """
+            Delete the files of the chunks dropped by the last save. Must be called once the backup returned by save is submitted
+            to the writer, so that they are deleted after it is written
+        """
+        for chunk in self.obsolete:
+            self.writer.submit(os.remove, chunk["path"])
+        self.obsolete = []
+
+    def load(self, chunks):
+        """
+            Rebuild the replay buffer from the chunks of a backup
+        """
+        self.chunks = list(chunks)
+        for chunk in self.chunks:
+            with np.load(chunk["path"]) as data:
+                self.replay_buffer.loadChunk(data)
+        self.checkpoint = self.replay_buffer.n_added
+        self.obsolete = []
@@ -0,0 +1,72 @@
+"""
+
+    Array-backed sum tree used by the prioritized replay. Updates and sampling are vectorized over batches in O(log n)
+
+"""
+
+import numpy as np
+
+class SumTree:
+    """
+        Binary tree stored in a flat array where each node holds the sum of its children.
+        The root is at index 1, the children of node i are 2i and 2i + 1 and the leaves hold the priorities
+    """
+    def __init__(self, capacity):
+        """
+            params:
+                capacity: Number of leaves (priorities)
+        """
+        self.capacity = capacity
+        # Number of leaves rounded to a power of 2 so that every level is full
+        self.n_leaves = 1
+        while self.n_leaves < capacity:
+            self.n_leaves *= 2
+        self.depth = self.n_leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.n_leaves, dtype=np.float64)
+
+    def total(self):
+        """
+            Return the sum of the priorities
+        """
+        return self.tree[1]
+
+    def get(self, idxs):
+        """
+            Return the priorities of the given leaves
+        """
+        return self.tree[self.n_leaves + idxs]
+
+    def update(self, idxs, priorities):
+        """
+            Set the priorities of the given leaves and update their ancestors level by level
+        """
+        nodes = self.n_leaves + np.asarray(idxs, dtype=np.int64)
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def setAll(self, priorities):
+        """
+            Replace every priority and rebuild the whole tree
+        """
+        self.tree[:] = 0
+        self.tree[self.n_leaves:self.n_leaves + len(priorities)] = priorities
+        start = self.n_leaves
+        while start > 1:
+            start //= 2
+            self.tree[start:2 * start] = self.tree[2 * start:4 * start:2] + self.tree[2 * start + 1:4 * start:2]
+
+    def find(self, values):
+        """
+            Return the leaves where the cumulative sums of the priorities reach the given values (between 0 and total())
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sums = self.tree[left]
+            go_right = values >= left_sums
+            values -= left_sums * go_right
+            nodes = left + go_right
+        return nodes - self.n_leaves
@@ -0,0 +1,69 @@
+"""
+
+    Capture backend replaying recorded frames from a file with their original timing. inherit from TMCapture
+
+"""
+
+import time
+import numpy as np
+
+from core.TMCapture import TMCapture
+
+class TMReplayCapture(TMCapture):
+    """
+        Capture backend replaying recorded frames from a file with their original timing. inherit from TMCapture
+    """
+    def __init__(self, record_path, speed=1.0, loop=True):
+        """
+            params:
+                record_path: Path of a recording made with TMReplayCapture.record (.npz file)
+                speed: Replay speed factor. If None the frames are replayed as fast as possible
+                loop: Wether the replay should start again once the last frame is reached
+        """
+        record = np.load(record_path)
+        self.frames = record["frames"]
+        self.timestamps = record["timestamps"].astype(np.float64)
+        if len(self.frames) == 0:
+            raise ValueError("{} doesn't contain any frame".format(record_path))
+        self.speed = speed
+        self.loop = loop
+        self._idx = 0
+        # Duration of one pass over the recording, used to keep timestamps increasing when looping
+        self._duration = self.timestamps[-1] - self.timestamps[0] + (self.timestamps[-1] - self.timestamps[-2] if len(self.timestamps) > 1 else 0)
+        self._n_loops = 0
+        self._start_time = None
+
+    @staticmethod
+    def record(record_path, capture, n_frames):
+        """
+            Record "n_frames" frames of the given capture backend in the "record_path" file
+        """
+        frames = []
+        timestamps = []
+        for _ in range(n_frames):
+            screen, t = capture.getScreenshot()
+            frames.append(np.array(screen))
+            timestamps.append(t)
+        np.savez(record_path, frames=np.stack(frames, axis=0), timestamps=np.array(timestamps))
+
+    def getScreenshot(self):
+        """
+            Return the next recorded frame, waiting for its original delay if a speed is set, and its rebased timestamp
+        """
+        if self._idx >= len(self.frames):
+            if not self.loop:
+                raise Exception("End of the recording reached")
+            self._idx = 0
+            self._n_loops += 1
+        # Time of the frame relative to the start of the replay
+        t_record = self.timestamps[self._idx] - self.timestamps[0] + self._n_loops * self._duration
+        if self._start_time is None:
+            self._start_time = time.time()
+        if self.speed is not None:
+            t_record /= self.speed
+            delay = self._start_time + t_record - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        frame = self.frames[self._idx]
+        self._idx += 1
+        return frame, self._start_time + t_record
@@ -0,0 +1,52 @@
+"""
+
+    Capture backend generating synthetic frames at a given FPS and resolution. inherit from TMCapture
+    Usefull to benchmark and profile the capture pipeline without the game
+
+"""
+
+import time
+import numpy as np
+
+from core.TMCapture import TMCapture
+
+class TMSyntheticCapture(TMCapture):
+    """
+        Capture backend generating synthetic frames at a given FPS and resolution. inherit from TMCapture
+    """
+    def __init__(self, width=640, height=360, fps=60):
+        """
+            params:
+                width: Width of the generated frames
+                height: Height of the generated frames
+                fps: Number of frames generated per second. If None the frames are generated as fast as possible
+        """
+        self.width = width
+        self.height = height
+        self.fps = fps
+        # Pre-render a scrolling pattern twice as large as a frame. The frames are views on it so generating one is free
+        x = np.arange(2 * width)
+        y = np.arange(height)
+        pattern = np.empty((height, 2 * width, 3), dtype=np.uint8)
+        pattern[..., 0] = (x[None, :] * 255 // width) % 256
+        pattern[..., 1] = (y[:, None] * 255 // max(height - 1, 1))
+        pattern[..., 2] = ((x[None, :] // 16 + y[:, None] // 16) % 2) * 255
+        self._pattern = pattern
+        self._n_frames = 0
+        self._next_frame_time = None
+
+    def getScreenshot(self):
+        """
+            Return the next synthetic frame and the timestamp it was generated at
+        """
+        if self.fps is not None:
+            # Wait for the frame deadline
+            now = time.perf_counter()
+            if self._next_frame_time is None:
+                self._next_frame_time = now
+            elif now < self._next_frame_time:
+                time.sleep(self._next_frame_time - now)
+            self._next_frame_time = max(self._next_frame_time + 1 / self.fps, time.perf_counter() - 1 / self.fps)
+        offset = (self._n_frames * 4) % self.width
+        self._n_frames += 1
+        return self._pattern[:, offset:offset + self.width], time.time()
@@ -0,0 +1,26 @@
+"""
+
+    Capture backend taking screenshots of the Trackmania window. inherit from TMCapture
+
+"""
+
+from core.TMCapture import TMCapture
+from utils.WindowCapture import WindowCapture
+
+class TMWindowCapture(TMCapture):
+    """
+        Capture backend taking screenshots of the Trackmania window. inherit from TMCapture
+    """
+    def __init__(self, window_name="Trackmania", hwnd=None):
+        """
+            params:
+                window_name: name of the window to capture
+                hwnd: handle of the window to capture. Usefull when several game instances are running. If None the window is found by its name
+        """
+        self.window_capture = WindowCapture(window_name, hwnd)
+
+    def getScreenshot(self):
+        """
+            Return a screenshot of the window and the timestamp it was taken at
+        """
+        return self.window_capture.get_screenshot()
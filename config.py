@@ -16,6 +16,8 @@ OP_CHRONO_TO_WAIT_BEFORE_PLAYING = -200
 ###
 # FPS goal to reach. IMPORTANT: For training stability you should set this value under the true performances of your hardware to keep the FPS as constant as possible 
 ENV_MAX_FPS = 7
+# Duration (in seconds) of the end of each step wait spent spinning instead of sleeping. Makes the FPS more precise at the cost of some CPU. 0 to disable
+ENV_SPIN_WAIT = 0.001
 # Reward to attribute when a cp is crossed
 ENV_CP_REWARD = 1
 # Reward to attribute when the finish line is crossed
@@ -24,6 +26,8 @@ ENV_FINISH_REWARD = 1
 ENV_DEFAULT_REWARD = -0.008
 # Max time allowed for the agent between two CPS before considering it's stuck
 ENV_PLAYING_TIMEOUT = 35
+# Max time to wait for the run to start after a reset before trying again
+ENV_RESET_TIMEOUT = 2
 ###
 # Draw settings
 ###
@@ -34,4 +38,6 @@ DRAW_LAYOUT_WIDTH = 100
 DRAW_LAYOUT_TITLE_PADDING = 15
 DRAW_LAYOUT_HEIGHT_DRAWER = DRAW_LAYOUT_HEIGHT - DRAW_LAYOUT_TITLE_PADDING
 # Padding to make space for the graduation of a plot
-DRAW_LAYOUT_GRADUATION_PADDING = 10
\ No newline at end of file
+DRAW_LAYOUT_GRADUATION_PADDING = 10
+# Maximum number of times per second the UI is refreshed, independently of the FPS of the environment
+DRAW_REFRESH_RATE = 10
\ No newline at end of file
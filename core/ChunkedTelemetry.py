@@ -0,0 +1,206 @@
+"""
+
+    Binary columnar format for the telemetry. The rows are grouped in fixed-size chunks and each metric is appended to its own
+    float64 file, so that a whole column can be memory-mapped. The chunks are listed in an index file
+
+    Layout of the directory:
+        columns.json: names of the metrics and number of rows per chunk
+        index.jsonl: one line per sealed chunk (first row, number of rows, byte offset in the column files, time range)
+        column_<i>.f64: values of the i-th metric, NaN where the row had no value
+        timestamps.f64: time at which each row was appended (seconds since epoch)
+        tail_<first row>.npz: rows appended after the last sealed chunk, written at checkpoints and on close
+
+"""
+
+import json
+import os
+import numpy as np
+from functools import partial
+
+from utils.BackgroundWriter import atomicSave
+
+def getColumnPath(directory, i):
+    return os.path.join(directory, "column_{}.f64".format(i))
+
+def getTailPath(directory, start):
+    return os.path.join(directory, "tail_{:012d}.npz".format(start))
+
+class ChunkedTelemetryWriter:
+    """
+        Accumulate the rows in a chunk in memory and append the sealed chunks to the column files
+    """
+    def __init__(self, directory, metrics, chunk_rows=4096):
+        """
+            params:
+                directory: Directory of the telemetry files, created if needed
+                metrics: list of the name of the metrics
+                chunk_rows: Number of rows per chunk
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        columns_path = os.path.join(directory, "columns.json")
+        if os.path.isfile(columns_path):
+            with open(columns_path, 'r') as f:
+                columns = json.load(f)
+            if columns["metrics"] != list(metrics):
+                raise Exception("The metrics of {} don't match: {}".format(directory, columns["metrics"]))
+            chunk_rows = columns["chunk_rows"]
+        else:
+            atomicSave(columns_path, partial(json.dump, {"metrics": list(metrics), "chunk_rows": chunk_rows}), 'w')
+        self.metrics = list(metrics)
+        self.chunk_rows = chunk_rows
+        self.index = ChunkedTelemetryReader.readIndex(directory)
+        # Number of rows in the sealed chunks, written or not
+        self.n_sealed = len(self.index) * chunk_rows
+        # Chunk being filled
+        self.tail_values = np.full((chunk_rows, len(self.metrics)), np.nan)
+        self.tail_timestamps = np.zeros(chunk_rows)
+        self.tail_rows = 0
+
+    def append(self, row, timestamp):
+        """
+            Append a row (list of floats, NaN for the missing values). Return the sealed chunk when this row completes it, otherwise None
+        """
+        self.tail_values[self.tail_rows] = row
+        self.tail_timestamps[self.tail_rows] = timestamp
+        self.tail_rows += 1
+        if self.tail_rows < self.chunk_rows:
+            return None
+        # One contiguous array per column
+        chunk = {
+            "start": self.n_sealed,
+            "values": np.ascontiguousarray(self.tail_values.T),
+            "timestamps": self.tail_timestamps.copy()
+        }
+        self.n_sealed += self.chunk_rows
+        self.tail_values[:] = np.nan
+        self.tail_rows = 0
+        return chunk
+
+    def writeChunk(self, chunk, sync=False):
+        """
+            Append a sealed chunk to the column files, then to the index. Called on the background thread of Telemetry
+        """
+        offset = chunk["start"] * 8
+        paths = [getColumnPath(self.directory, i) for i in range(len(self.metrics))] + [os.path.join(self.directory, "timestamps.f64")]
+        for path, values in zip(paths, list(chunk["values"]) + [chunk["timestamps"]]):
+            with open(path, 'ab') as f:
+                # Bytes of an interrupted write are overwritten
+                f.seek(offset)
+                f.truncate()
+                f.write(values.tobytes())
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        # The chunk is listed once its data is written
+        entry = {
+            "start": chunk["start"],
+            "rows": len(chunk["timestamps"]),
+            "offset": offset,
+            "t_start": float(chunk["timestamps"][0]),
+            "t_end": float(chunk["timestamps"][-1])
+        }
+        with open(os.path.join(self.directory, "index.jsonl"), 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        self.index.append(entry)
+
+    def getTail(self):
+        """
+            Return a copy of the rows of the chunk being filled: (first row, values, timestamps)
+        """
+        return self.n_sealed, self.tail_values[:self.tail_rows].copy(), self.tail_timestamps[:self.tail_rows].copy()
+
+    @staticmethod
+    def saveTail(path, values, timestamps):
+        atomicSave(path, partial(np.savez, values=values, timestamps=timestamps))
+
+    def setTail(self, values, timestamps):
+        """
+            Replace the rows of the chunk being filled
+        """
+        self.tail_values[:] = np.nan
+        self.tail_values[:len(values)] = values
+        self.tail_timestamps[:len(timestamps)] = timestamps
+        self.tail_rows = len(values)
+
+    def truncate(self, n_chunks):
+        """
+            Drop the chunks after the "n_chunks" first ones, to go back to the state of a backup
+        """
+        if n_chunks > len(self.index):
+            raise Exception("The telemetry backup references {} chunks, only {} are in {}".format(n_chunks, len(self.index), self.directory))
+        self.index = self.index[:n_chunks]
+        atomicSave(os.path.join(self.directory, "index.jsonl"), lambda f: f.writelines(json.dumps(entry) + "\n" for entry in self.index), 'w')
+        size = n_chunks * self.chunk_rows * 8
+        for path in [getColumnPath(self.directory, i) for i in range(len(self.metrics))] + [os.path.join(self.directory, "timestamps.f64")]:
+            if os.path.isfile(path):
+                os.truncate(path, min(size, os.path.getsize(path)))
+        self.n_sealed = n_chunks * self.chunk_rows
+        self.setTail(np.empty((0, len(self.metrics))), np.empty(0))
+
+class ChunkedTelemetryReader:
+    """
+        Read a telemetry directory without parsing: the columns of the sealed chunks are memory-mapped
+    """
+    def __init__(self, directory):
+        """
+            params:
+                directory: Directory written by ChunkedTelemetryWriter
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "columns.json"), 'r') as f:
+            columns = json.load(f)
+        self.metrics = columns["metrics"]
+        self.chunk_rows = columns["chunk_rows"]
+        self.index = ChunkedTelemetryReader.readIndex(directory)
+        self.n_rows = len(self.index) * self.chunk_rows
+
+    @staticmethod
+    def readIndex(directory):
+        """
+            Return the entries of the index of the chunks
+        """
+        path = os.path.join(directory, "index.jsonl")
+        if not os.path.isfile(path):
+            return []
+        index = []
+        with open(path, 'r') as f:
+            for line in f:
+                # A line cut by a crash is ignored, its chunk is written again
+                if line.endswith("\n"):
+                    index.append(json.loads(line))
+        return index
+
+    def mapFile(self, path):
+        if self.n_rows == 0:
+            return np.empty(0)
+        return np.memmap(path, dtype=np.float64, mode='r', shape=(self.n_rows,))
+
+    def get(self, column):
+        """
+            Return the values of the sealed chunks of a metric as a read-only memory-mapped array. NaN where a row had no value
+        """
+        return self.mapFile(getColumnPath(self.directory, self.metrics.index(column)))
+
+    def getTimestamps(self):
+        """
+            Return the time of each row of the sealed chunks as a read-only memory-mapped array
+        """
+        return self.mapFile(os.path.join(self.directory, "timestamps.f64"))
+
+    def getTail(self, path=None):
+        """
+            Return the rows after the sealed chunks: (values, timestamps). Empty if they weren't saved
+
+            params:
+                path: Tail file to read. By default the one starting after the last sealed chunk
+        """
+        if path is None:
+            path = getTailPath(self.directory, self.n_rows)
+        if not os.path.isfile(path):
+            return np.empty((0, len(self.metrics))), np.empty(0)
+        with np.load(path) as tail:
+            return tail["values"], tail["timestamps"]
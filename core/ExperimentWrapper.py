@@ -234,4 +234,5 @@ class ExperimentWrapper:
                     if done:
                         break
 
-                print("Finished ! Obtained {} rewards".format(total_rewards))
\ No newline at end of file
+                print("Finished ! Obtained {} rewards".format(total_rewards))
+        self.telemetry.close()
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+
+    Preallocated ring buffer storing the captured frames and their timestamps
+
+"""
+
+import threading
+import numpy as np
+
+class FrameBuffer:
+    """
+        Preallocated ring buffer storing the captured frames and their timestamps.
+        Each frame is written twice (at its slot and at its slot + capacity) so that the last n frames are always
+        contiguous in memory and can be returned as a view without any copy.
+    """
+    def __init__(self, capacity, frame_shape, dtype=np.uint8):
+        """
+            params:
+                capacity: Number of frames to keep track of
+                frame_shape: Shape of a single frame e.g (H, W) or (H, W, C)
+                dtype: Type of the frames
+        """
+        self.capacity = capacity
+        self.frame_shape = tuple(frame_shape)
+        # The actual data, mirrored
+        self._frames = np.zeros((2 * capacity,) + self.frame_shape, dtype=dtype)
+        self._times = np.zeros(2 * capacity, dtype=np.float64)
+        # Write cursor and number of frames written since the creation of the buffer
+        self._cursor = 0
+        self._count = 0
+        # Notified each time a frame is published
+        self._new_frame = threading.Condition()
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def getCount(self):
+        """
+            Return the number of frames written since the creation of the buffer
+        """
+        return self._count
+
+    def getWriteSlot(self):
+        """
+            Return the slot where the next frame will be written. Usefull to write a frame in place (e.g with the "dst" parameter of opencv).
+            The frame is published only when "commit" is called
+        """
+        return self._frames[self._cursor]
+
+    def commit(self, timestamp):
+        """
+            Publish the frame written in the write slot
+        """
+        cursor = self._cursor
+        self._frames[cursor + self.capacity] = self._frames[cursor]
+        self._times[cursor] = self._times[cursor + self.capacity] = timestamp
+        with self._new_frame:
+            self._cursor = (cursor + 1) % self.capacity
+            self._count += 1
+            self._new_frame.notify_all()
+
+    def append(self, frame, timestamp):
+        """
+            Copy the given frame in the buffer
+        """
+        self._frames[self._cursor] = frame
+        self.commit(timestamp)
+
+    def waitFor(self, predicate, timeout=None):
+        """
+            Block until "predicate" returns True. The predicate is checked each time a frame is published.
+            Return the last value of the predicate (False if the timeout expired)
+        """
+        with self._new_frame:
+            return self._new_frame.wait_for(predicate, timeout)
+
+    def getLast(self, n_frames=1, out=None):
+        """
+            Return the last "n_frames" frames (oldest first) and their timestamps or None if there isn't enough frames.
+            If "out" is provided, the frames are copied in it, otherwise a read-only view of the buffer is returned.
+            Warning: a view stays valid only until "capacity - n_frames" new frames are written
+        """
+        if n_frames > self.capacity:
+            raise ValueError("Can't read {} frames from a buffer of capacity {}".format(n_frames, self.capacity))
+        with self._new_frame:
+            if self._count < n_frames:
+                return None
+            end = self._cursor + self.capacity
+        frames = self._frames[end - n_frames:end]
+        times = self._times[end - n_frames:end]
+        if out is None:
+            frames = frames.view()
+            frames.flags.writeable = False
+        else:
+            np.copyto(out, frames)
+            frames = out
+        return frames, times.tolist()
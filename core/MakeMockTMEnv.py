@@ -0,0 +1,66 @@
+"""
+    
+    Entry point to create a Trackmania environment backed by local stand-ins for the game:
+    a MockOpenplanet for the in-game data, a synthetic screen capture and a mock controller.
+    Usefull to test algorithms and tools without the game
+
+    Example of use:
+         with MakeMockTMEnv() as tmenv:
+                ...
+
+"""
+
+from core.MakeTMEnv import MakeTMEnv
+from core.MockOpenplanet import MockOpenplanet, makeEpisodeScript
+from captures.TMSyntheticCapture import TMSyntheticCapture
+from devices.TMMockDevice import TMMockDevice
+
+class MakeMockTMEnv(MakeTMEnv):
+    """
+        Entry point to create a Trackmania environment backed by local stand-ins for the game
+
+        Example of use:
+            with MakeMockTMEnv() as tmenv:
+                    ...
+    """
+    def __init__(self,
+            script=None,
+            rate=60,
+            include_time_left=True,
+            port=50000,
+            profile=False
+        ):
+        """
+            params:
+                script: Episode script followed by the mock (see makeEpisodeScript). Default to a run with 2 checkpoints and a finish line
+                rate: Number of messages per second sent by the mock
+                include_time_left (boolean): Wether the states should contain time left before timeout
+                port: Port used between the bridge and the mock
+                profile (boolean): Wether to time the phases of the steps (see StepProfiler)
+        """
+        if script is None:
+            script = makeEpisodeScript(countdown=1.5, checkpoints=(2, 4), finish=6)
+        self.mock_openplanet = MockOpenplanet(script, rate=rate, port=port)
+        super().__init__(
+            controller=TMMockDevice(self.mock_openplanet),
+            blocking_mode=True,
+            manual_override=False,
+            include_time_left=include_time_left,
+            capture=TMSyntheticCapture(),
+            port=port,
+            profile=profile
+        )
+
+    def bind(self):
+        """
+            Start the mock then bind the environment to it
+        """
+        self.mock_openplanet.start()
+        return super().bind()
+
+    def unbind(self):
+        """
+            Unbind the environment and stop the mock
+        """
+        self.mock_openplanet.stop()
+        return super().unbind()
@@ -8,14 +8,13 @@
 
 """
 
-import time
 import cv2
 import config
 
 from core.OpenPlanetBridge import OpenPlanetBridge
 from core.TMScreen import TMScreen
-from devices.TMKeyboard import TMKeyboard
 from core.TMEnv import TMEnv
+from core.StepProfiler import StepProfiler
 
 class MakeTMEnv:
     """
@@ -26,27 +25,52 @@ class MakeTMEnv:
                     ...
     """
     def __init__(self,
-            controller=TMKeyboard(),
+            controller=None,
             blocking_mode=True,
             manual_override=True,
-            include_time_left=True
+            include_time_left=True,
+            capture=None,
+            port=50000,
+            profile=False,
+            simulated=False
         ):
         """
             params:
-                controller (TMDevice): Trackmania controller e.g keyboard / controller / joystick
+                controller (TMDevice): Trackmania controller e.g keyboard / controller / joystick. If None a TMKeyboard is used
                 blocking_mode (boolean): Wether the "reset" method of tmenv will block your code. Strongly advise you to let this to True
                 manual_override (boolean): Wether the user should be able to override the agent's actions when using a physicall device.
                 include_time_left (boolean): Wether the states should contain time left before timeout
+                capture (TMCapture): Screen capture backend. If None the Trackmania window is captured
+                port: Port on which the openplanet script of the game instance sends its data
+                profile (boolean): Wether to time the phases of the steps (see StepProfiler). The summary is printed at the end of each episode
+                simulated (boolean): Wether to return a simulated environment (SimTMEnv) instead of binding the game. Usefull to iterate fast on algorithms.
+                                     The simulator provides its own controller and frames, so "controller" and "capture" must be None.
+                                     Its controller can't be overridden and its reset never waits for the game, whatever "manual_override" and "blocking_mode" are
         """
-        # In game data bridge
-        self.open_planet_bridge = OpenPlanetBridge()
-        # Screen capture
-        self.tm_screen = TMScreen()
+        self.simulated = simulated
+        if simulated and controller is not None:
+            raise Exception("The simulated environment uses its own controller, \"controller\" must be None")
+        if simulated and capture is not None:
+            raise Exception("The simulated environment renders its own frames, \"capture\" must be None")
+        if simulated:
+            # Nothing to bind, the simulator provides the data, the frames and the controller
+            self.open_planet_bridge = None
+            self.tm_screen = None
+        else:
+            # In game data bridge
+            self.open_planet_bridge = OpenPlanetBridge(port)
+            # Screen capture
+            self.tm_screen = TMScreen(capture)
+        # The keyboard is imported here because it relies on the windows api
+        if controller is None and not simulated:
+            from devices.TMKeyboard import TMKeyboard
+            controller = TMKeyboard()
 
         self.controller = controller
         self.blocking_mode = blocking_mode
         self.manual_override = manual_override
         self.include_time_left = include_time_left
+        self.profile = profile
 
         self.bound = False
         self.emergency_stop = False
@@ -63,6 +87,9 @@ class MakeTMEnv:
         """
         if self.bound:
             return False
+        if self.simulated:
+            self.bound = True
+            return True
         # Start the threads
         self.open_planet_bridge.capture()
         self.tm_screen.capture()
@@ -70,7 +97,9 @@ class MakeTMEnv:
         if self.blocking_mode:
             print("Waiting for you to run trackmania and load/reload the TMForge script on Openplanet")
             while not self.emergency_stop and not self.isObservable():
-                time.sleep(0.1)
+                # Wake up as soon as the first state and the first frame arrive. The timeout allows to check the emergency stop
+                self.open_planet_bridge.waitFor(lambda: True, timeout=0.1)
+                self.tm_screen.waitFor(lambda: self.tm_screen.getFrames() is not None, timeout=0.1)
             print("Script detected, starting the environment")
         self.bound = True
 
@@ -82,6 +111,9 @@ class MakeTMEnv:
         """
         if not self.bound:
             return False
+        if self.simulated:
+            self.bound = False
+            return True
         self.open_planet_bridge.stop()
         self.tm_screen.stop()
         self.bound = False
@@ -95,13 +127,17 @@ class MakeTMEnv:
     
     def __enter__(self):
         self.bind()
+        if self.simulated:
+            from core.SimTMEnv import SimTMEnv
+            return SimTMEnv(self.include_time_left, profiler=StepProfiler() if self.profile else None)
         return TMEnv(
             self.open_planet_bridge,
             self.tm_screen,
             self.controller,
             self.blocking_mode,
             self.manual_override,
-            self.include_time_left
+            self.include_time_left,
+            StepProfiler() if self.profile else None
         )
 
     def __exit__(self,  exc_type, exc_value, tb):
@@ -0,0 +1,186 @@
+"""
+
+    Column of a metric stored in growable typed NumPy chunks, with running aggregates and windowed views
+
+"""
+
+import numpy as np
+
+class MetricColumn:
+    """
+        Values of a metric stored in fixed-size NumPy chunks, with the time at which each value was appended.
+        Appending is O(1) and never copies the history. The running count/mean/min/max are updated on append,
+        and a running sum is stored along the values so that moving averages don't need to read the whole history.
+        Indexing and slicing work like on a list and return NumPy values
+    """
+    def __init__(self, chunk_size=4096):
+        """
+            params:
+                chunk_size: Number of values per chunk
+        """
+        self.chunk_size = chunk_size
+        # int64 until a non integer value is appended, then float64
+        self.dtype = None
+        self._values = []
+        self._sums = []
+        self._timestamps = []
+        self._size = 0
+        self.running_min = None
+        self.running_max = None
+
+    def __len__(self):
+        return self._size
+
+    def getSum(self):
+        """
+            Return the sum of all the values
+        """
+        return self._sums[-1][(self._size - 1) % self.chunk_size] if self._size > 0 else 0
+
+    def getStats(self):
+        """
+            Return the running count, mean, min and max of the column
+        """
+        return {
+            "count": self._size,
+            "mean": self.getSum() / self._size if self._size > 0 else None,
+            "min": self.running_min,
+            "max": self.running_max
+        }
+
+    def promote(self, value):
+        """
+            Choose the dtype of the column, or switch an integer column to float64 when "value" isn't an integer
+        """
+        dtype = np.int64 if isinstance(value, (int, np.integer, np.bool_)) else np.float64
+        if self.dtype is None:
+            self.dtype = dtype
+        elif self.dtype == np.int64 and dtype == np.float64:
+            self.dtype = np.float64
+            self._values = [chunk.astype(np.float64) for chunk in self._values]
+
+    def append(self, value, timestamp):
+        """
+            Append a value appended at "timestamp" (seconds since epoch)
+        """
+        if self.dtype != np.float64:
+            self.promote(value)
+        total = self.getSum() + value
+        offset = self._size % self.chunk_size
+        if offset == 0:
+            self._values.append(np.empty(self.chunk_size, dtype=self.dtype))
+            self._sums.append(np.empty(self.chunk_size, dtype=np.float64))
+            self._timestamps.append(np.empty(self.chunk_size, dtype=np.float64))
+        self._sums[-1][offset] = total
+        self._values[-1][offset] = value
+        self._timestamps[-1][offset] = timestamp
+        self._size += 1
+        if self.running_min is None or value < self.running_min:
+            self.running_min = value
+        if self.running_max is None or value > self.running_max:
+            self.running_max = value
+
+    def extend(self, values, timestamps):
+        """
+            Append several values at once (NumPy arrays), chunk by chunk
+        """
+        if len(values) == 0:
+            return
+        dtype = np.int64 if values.dtype.kind in "biu" else np.float64
+        if self.dtype != np.float64:
+            self.promote(values[0] if dtype == np.int64 else float(values[0]))
+        sums = self.getSum() + np.cumsum(values, dtype=np.float64)
+        done = 0
+        while done < len(values):
+            offset = self._size % self.chunk_size
+            if offset == 0:
+                self._values.append(np.empty(self.chunk_size, dtype=self.dtype))
+                self._sums.append(np.empty(self.chunk_size, dtype=np.float64))
+                self._timestamps.append(np.empty(self.chunk_size, dtype=np.float64))
+            n = min(self.chunk_size - offset, len(values) - done)
+            self._values[-1][offset:offset + n] = values[done:done + n]
+            self._sums[-1][offset:offset + n] = sums[done:done + n]
+            self._timestamps[-1][offset:offset + n] = timestamps[done:done + n]
+            self._size += n
+            done += n
+        vmin, vmax = values.min(), values.max()
+        self.running_min = vmin if self.running_min is None else min(self.running_min, vmin)
+        self.running_max = vmax if self.running_max is None else max(self.running_max, vmax)
+
+    def take(self, chunks, idxs):
+        """
+            Return the elements at positions "idxs" (sorted) of the column stored in "chunks"
+        """
+        idxs = np.asarray(idxs, dtype=np.int64)
+        out = np.empty(len(idxs), dtype=chunks[0].dtype if len(chunks) else np.float64)
+        chunk_ids = idxs // self.chunk_size
+        # Gather chunk by chunk: the indices are sorted so each chunk is a contiguous range
+        bounds = np.searchsorted(chunk_ids, np.arange(len(chunks) + 1))
+        for c in np.unique(chunk_ids):
+            start, end = bounds[c], bounds[c + 1]
+            out[start:end] = chunks[c][idxs[start:end] - c * self.chunk_size]
+        return out
+
+    def getRange(self, start, end):
+        """
+            Return the values from "start" to "end" (excluded) as a NumPy array. Only the chunks in the range are read
+        """
+        if start >= end:
+            return np.empty(0, dtype=self.dtype or np.float64)
+        first, last = start // self.chunk_size, (end - 1) // self.chunk_size
+        parts = self._values[first:last + 1]
+        parts[-1] = parts[-1][:end - last * self.chunk_size]
+        parts[0] = parts[0][start - first * self.chunk_size:]
+        return np.concatenate(parts)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, end, step = key.indices(self._size)
+            if step != 1:
+                return self.getRange(0, self._size)[key]
+            return self.getRange(start, end)
+        if key < 0:
+            key += self._size
+        if key < 0 or key >= self._size:
+            raise IndexError("MetricColumn index out of range")
+        return self._values[key // self.chunk_size][key % self.chunk_size]
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.getRange(0, self._size)
+        return values if dtype is None else values.astype(dtype)
+
+    def getLast(self, n):
+        """
+            Return the last "n" values
+        """
+        return self.getRange(max(0, self._size - n), self._size)
+
+    def getSince(self, t):
+        """
+            Return the values appended at or after the timestamp "t"
+        """
+        if self._size == 0:
+            return self.getRange(0, 0)
+        # The timestamps are increasing: find the first chunk ending after t, then search inside it
+        n_chunks = len(self._timestamps)
+        last_offsets = [self.chunk_size - 1] * (n_chunks - 1) + [(self._size - 1) % self.chunk_size]
+        chunk_ends = [chunk[offset] for chunk, offset in zip(self._timestamps, last_offsets)]
+        c = int(np.searchsorted(chunk_ends, t))
+        if c == n_chunks:
+            return self.getRange(0, 0)
+        start = c * self.chunk_size + int(np.searchsorted(self._timestamps[c][:last_offsets[c] + 1], t))
+        return self.getRange(start, self._size)
+
+    def getMovingAverage(self, n):
+        """
+            Reduce the column to "n" points with a non padded moving average over windows of len(self) // n values,
+            evenly spread over the column. Only 2n values of the running sum are read
+        """
+        window = self._size // n
+        starts = np.round(np.linspace(0, self._size - window, num=n)).astype(np.int64)
+        ends = self.take(self._sums, starts + window - 1)
+        # Running sum before the window, 0 for the windows starting at the first value
+        before = np.zeros(n)
+        nonzero = starts > 0
+        before[nonzero] = self.take(self._sums, starts[nonzero] - 1)
+        return (ends - before) / window
@@ -0,0 +1,162 @@
+"""
+
+    Local stand-in for the openplanet script (Plugin_TMForge.as). Speaks the same protocol and follows scripted episodes.
+    Usefull to test the environment and to load test the OpenPlanetBridge without the game
+
+"""
+
+import socket
+import threading
+import time
+
+def makeEpisodeScript(countdown=1.5, checkpoints=(), finish=None, max_cp=None, menu=0):
+    """
+        Return a script describing an episode. A script is a function taking the time elapsed since the last restart (in seconds)
+        and returning the state of the game (without the "t" field)
+
+        params:
+            countdown: Duration of the countdown before the start of the run
+            checkpoints: Run times (in seconds) at which the checkpoints are crossed
+            finish: Run time at which the finish line is crossed. If None the run never ends (Usefull to test the timeout)
+            max_cp: Number of checkpoints of the map. Default to the number of checkpoints
+            menu: Time spent in the menus before the countdown
+    """
+    checkpoints = sorted(checkpoints)
+    max_cp = len(checkpoints) if max_cp is None else max_cp
+    def script(elapsed):
+        if elapsed < menu:
+            return {"in_game": False, "game_state": "None", "time": 0, "CP": 0, "maxCP": max_cp}
+        run_time = elapsed - menu - countdown
+        if finish is not None and run_time >= finish:
+            # The run time stops when the finish line is crossed
+            return {"in_game": False, "game_state": "Finish", "time": int(finish * 1000), "CP": len(checkpoints), "maxCP": max_cp}
+        n_cp = 0
+        while n_cp < len(checkpoints) and checkpoints[n_cp] <= run_time:
+            n_cp += 1
+        return {"in_game": True, "game_state": "Playing", "time": int(run_time * 1000), "CP": n_cp, "maxCP": max_cp}
+    return script
+
+class MockOpenplanet:
+    """
+        Local stand-in for the openplanet script. Connects to the OpenPlanetBridge and sends the state given by a script
+    """
+    def __init__(self, script=None, rate=60, port=50000):
+        """
+            params:
+                script: Function returning the state of the game from the time elapsed since the last restart (see makeEpisodeScript)
+                rate: Number of messages sent per second. If None the messages are sent as fast as possible
+                port: Port of the OpenPlanetBridge
+        """
+        self.script = makeEpisodeScript() if script is None else script
+        self.rate = rate
+        self.port = port
+        self.is_sending = False
+        self._send_thread = None
+        self._restart_time = time.perf_counter()
+        # Number of messages sent since the creation of the mock
+        self._n_sent = 0
+        # Number of sent messages after which a delayed restart happens
+        self._restart_at = None
+
+    def restart(self, delay_messages=0):
+        """
+            Restart the script. Equivalent of a reset of the run in-game
+
+            params:
+                delay_messages: Number of messages still describing the previous run before the restart,
+                                like the frames the game renders before handling the reset key
+        """
+        if delay_messages > 0:
+            self._restart_at = self._n_sent + delay_messages
+        else:
+            self._restart_at = None
+            self._restart_time = time.perf_counter()
+
+    def getElapsed(self):
+        """
+            Return the time elapsed since the last restart
+        """
+        return time.perf_counter() - self._restart_time
+
+    def getSentCount(self):
+        """
+            Return the number of messages sent since the creation of the mock
+        """
+        return self._n_sent
+
+    def start(self):
+        """
+            Create the sending thread
+        """
+        if self.is_sending:
+            return False
+
+        self.is_sending = True
+        self._send_thread = threading.Thread(target=self._send)
+        self._send_thread.start()
+
+        return True
+
+    def _connect(self):
+        """
+            Try to connect to the bridge until it succeeds or the mock is stopped
+        """
+        while self.is_sending:
+            try:
+                return socket.create_connection(('localhost', self.port), timeout=1.0)
+            except OSError:
+                time.sleep(0.1)
+        return None
+
+    def _send(self):
+        """
+            Send continuously the state of the game to the bridge
+        """
+        connection = self._connect()
+        next_send_time = time.perf_counter()
+        while self.is_sending and connection is not None:
+            if self._restart_at is not None and self._n_sent >= self._restart_at:
+                self._restart_at = None
+                self._restart_time = time.perf_counter()
+            state = self.script(self.getElapsed())
+            message = '{{"t": {}, "in_game": {}, "game_state": "{}", "time": {}, "CP": {}, "maxCP": {}}}'.format(
+                int(time.time()),
+                "true" if state["in_game"] else "false",
+                state["game_state"],
+                state["time"],
+                state["CP"],
+                state["maxCP"]
+            )
+            try:
+                connection.sendall(message.encode("utf-8"))
+            except OSError:
+                # The bridge closed the connection, try to reconnect like the openplanet script does
+                connection.close()
+                connection = self._connect()
+                continue
+            self._n_sent += 1
+            # Respect the sending rate
+            if self.rate is not None:
+                next_send_time += 1 / self.rate
+                delay = next_send_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_send_time = time.perf_counter()
+        if connection is not None:
+            connection.close()
+
+    def stop(self):
+        """
+            Stop / Join the sending thread
+        """
+        if not self.is_sending:
+            return False
+
+        self.is_sending = False
+
+        if self._send_thread is not None:
+            self._send_thread.join(timeout=1)
+            self._send_thread = None
+
+        return True
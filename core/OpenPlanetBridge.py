@@ -9,21 +9,44 @@ import json
 import threading
 import config
 
+from core.StreamFramer import StreamFramer
+
 
 class OpenPlanetBridge:
     """
         Handler for the communication with the in-game data aka Openplanet
     """
-    def __init__(self):
+    def __init__(self, port=50000):
+        """
+            params:
+                port: Port on which the openplanet script sends its data
+        """
+        self.port = port
         # Create the socket
-        self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.s.bind(('localhost', 50000))
-        self.s.settimeout(1.0)
+        self.s = self.createSocket()
 
         self._listen_thread = None
         self._state = None
+        # Split the stream into messages
+        self.framer = StreamFramer()
+        # Number of messages successfully parsed
+        self._n_messages = 0
+        # Number of complete messages received. Increases each time the state is refreshed
+        self._sequence = 0
+        # Notified each time the state is refreshed
+        self._new_state = threading.Condition()
         self.is_listening = False
 
+    def createSocket(self):
+        """
+            Create the listening socket bound to localhost:port
+        """
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(('localhost', self.port))
+        s.settimeout(1.0)
+        return s
+
     def capture(self):
         """
             Create the socket-listening thread
@@ -40,37 +63,50 @@ class OpenPlanetBridge:
 
     def _capture(self):
         """
-            Listen to the data sent by the openplanet script on the socket at localhost:50000
+            Listen to the data sent by the openplanet script on the socket at localhost:port
         """  
         self.s.listen(1)
         connection = None
+        # Reusable reception buffer
+        recv_buffer = bytearray(4096)
+        recv_view = memoryview(recv_buffer)
         while self.is_listening:
             try:
                 connection, addr = self.s.accept()
+                # Accepted sockets are blocking, use a timeout so that stop() can join the thread
+                connection.settimeout(1.0)
+                self.framer.reset()
                 while self.is_listening:
-                    data = connection.recv(1024).decode("utf-8")
-                    if not data:
+                    try:
+                        n = connection.recv_into(recv_buffer)
+                    except socket.timeout:
+                        continue
+                    if not n:
                         break
-                    # This is handling the case where the data is accumulating without a read operation. In that case we use the last parsable message
-                    idx2 = data.rfind("}")
-                    data = data[:idx2+1]
-                    idx1 = data.rfind("{")
-                    data = data[idx1:]
-                    if idx1 >=0 and idx2 > 0:
-                        try:
-                            # Update the internal state
-                            self._state = json.loads(data)
-                        except:
-                            print("Couldn't decode packet: ", data)
-                    else:
-                        print("weird packet going on")
+                    # When the data is accumulating without a read operation, only the newest complete message is parsed
+                    n_messages = self.framer.n_messages
+                    data = self.framer.feed(recv_view[:n])
+                    if data is None:
+                        continue
+                    try:
+                        state = json.loads(data)
+                    except ValueError:
+                        print("Couldn't decode packet: ", data)
+                        continue
+                    # Update the internal state. The sequence only moves when the state was refreshed
+                    with self._new_state:
+                        self._state = state
+                        self._n_messages += 1
+                        self._sequence += self.framer.n_messages - n_messages
+                        self._new_state.notify_all()
             except socket.timeout:
                 pass
             except KeyboardInterrupt:
                 break
-        # Close the connection
+        # Close the connection and the listening socket
         if connection:
             connection.close()
+        self.s.close()
 
     def stop(self):
         """
@@ -82,21 +118,47 @@ class OpenPlanetBridge:
         self.is_listening = False
 
         if self._listen_thread is not None:
-            self._listen_thread.join(timeout=1)
+            # Socket operations time out after 1s so the thread is joined within this delay
+            self._listen_thread.join(timeout=2)
             self._listen_thread = None
-            # Create a new thread ready to start
-            self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.s.bind(('localhost', 50000))
-            self.s.settimeout(1.0)
+            # Create a new socket ready to start
+            self.s = self.createSocket()
 
         return True
 
+    def waitFor(self, predicate, timeout=None):
+        """
+            Block until a state was received and "predicate" returns True. The predicate is checked each time the state is refreshed.
+            Return the last value of the predicate (False if the timeout expired)
+        """
+        with self._new_state:
+            return self._new_state.wait_for(lambda: self._state is not None and predicate(), timeout)
+
     def getState(self):
         """
             Return the current internal values of the game
         """
         return self._state
 
+    def getMessageCount(self):
+        """
+            Return the number of messages parsed since the creation of the bridge
+        """
+        return self._n_messages
+
+    def getSequence(self):
+        """
+            Return the sequence number of the current state. It's the number of complete messages received so
+            it increases monotonically and tells if the state was refreshed since a previous call
+        """
+        return self._sequence
+
+    def getSkippedCount(self):
+        """
+            Return the number of complete messages skipped because a newer one was received in the same read
+        """
+        return self.framer.n_skipped
+
     def getTime(self):
         """
             Return the in-game time of the current run
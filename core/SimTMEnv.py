@@ -0,0 +1,258 @@
+"""
+
+    Fast headless simulated environments with the same API as TMEnv (SimTMEnv) and VecTMEnv (SimVecTMEnv).
+    Usefull to iterate on algorithms without the game. If you want to instanciate SimTMEnv, you can use MakeTMEnv(simulated=True)
+
+    Example of use:
+         with MakeTMEnv(simulated=True) as tmenv:
+                ...
+
+"""
+
+import time
+from collections import deque
+import numpy as np
+import config
+
+from core.TrackSimulator import TrackSimulator
+from core.StepScheduler import StepScheduler
+from devices.TMSimController import TMSimController
+
+class SimVecTMEnv:
+    """
+        Batch of simulated cars with the same API as VecTMEnv. Finished runs are reset automatically.
+    """
+    def __init__(self, n_envs=1, include_time_left=True, realtime=False, **simulator_params):
+        """
+            params:
+                n_envs: Number of cars simulated in parallel
+                include_time_left (boolean): Wether the states should contain time left before timeout
+                realtime (boolean): Wether the steps should be paced according to ENV_MAX_FPS like the real environment. Otherwise they run as fast as possible
+                simulator_params: Parameters of the TrackSimulator
+        """
+        self.n_envs = n_envs
+        self.include_time_left = include_time_left
+        self.simulator = TrackSimulator(n_cars=n_envs, **simulator_params)
+        self.controller = TMSimController()
+        self.ACTION_SPACE = self.controller.ACTION_SPACE
+        self.scheduler = StepScheduler(config.ENV_MAX_FPS, config.ENV_SPIN_WAIT) if realtime else None
+        # Last CAPTURE_N_FRAMES frames of each car
+        self.frames = np.zeros((n_envs, config.CAPTURE_N_FRAMES, config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH), dtype=np.uint8)
+        self.prop_before_timeout = np.ones(n_envs)
+        self._pending_actions = None
+        self._step_times = deque()
+
+    def pushFrames(self, mask=None):
+        """
+            Render the cars and add the new frames to their frame stacks. After a reset the stack is filled with the first frame
+        """
+        frames = self.simulator.render()
+        if mask is None:
+            self.frames[:, :-1] = self.frames[:, 1:]
+            self.frames[:, -1] = frames
+        else:
+            self.frames[mask] = frames[mask][:, None]
+
+    def getObservations(self):
+        """
+            Return the current states of the cars. Same format as TMEnv.getObservation: (time left plane +) CAPTURE_N_FRAMES frames
+        """
+        n_planes = config.CAPTURE_N_FRAMES + 1 if self.include_time_left else config.CAPTURE_N_FRAMES
+        states = np.empty((self.n_envs, n_planes, config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH), dtype=np.uint8)
+        states[:, n_planes - config.CAPTURE_N_FRAMES:] = self.frames
+        if self.include_time_left:
+            states[:, 0] = np.clip(np.round(self.prop_before_timeout * 255), 0, 255).astype(np.uint8)[:, None, None]
+        if not config.CAPTURE_GREYSCALE:
+            states = np.repeat(states[..., None], 3, axis=-1)
+        return states
+
+    def resetCars(self, mask=None):
+        """
+            Reset the cars selected by "mask" (all of them by default)
+        """
+        self.simulator.reset(mask)
+        if mask is None:
+            self.prop_before_timeout[:] = 1
+            self.pushFrames(np.ones(self.n_envs, dtype=bool))
+        else:
+            self.prop_before_timeout[mask] = 1
+            self.pushFrames(mask)
+
+    def reset(self):
+        """
+            Reset every car. Return the stacked initial states
+        """
+        self.resetCars()
+        if self.scheduler is not None:
+            self.scheduler.start()
+        return self.getObservations()
+
+    def step_async(self, actions):
+        """
+            Store one action per car. The simulation runs in step_wait
+        """
+        if self._pending_actions is not None:
+            raise Exception("step_async called twice without step_wait")
+        self._pending_actions = np.asarray(actions, dtype=np.int64)
+
+    def step_wait(self):
+        """
+            Simulate one step. Return the stacked states, the rewards and dones as arrays, and the list of infos
+        """
+        if self._pending_actions is None:
+            raise Exception("step_wait called without step_async")
+        actions, self._pending_actions = self._pending_actions, None
+        if self.scheduler is not None:
+            self.scheduler.wait()
+        rewards, dones, finished, self.prop_before_timeout = self.simulator.step(actions)
+        self.pushFrames()
+        states = self.getObservations()
+        infos = [{
+            "performed_action": int(actions[i]),
+            "is_finished": bool(finished[i]),
+            "action_latency": 0.0,
+            "prop_before_timeout": float(self.prop_before_timeout[i])
+        } for i in range(self.n_envs)]
+        if dones.any():
+            # Automatically start a new episode. The last state of the finished episode is kept in the info
+            for i in np.flatnonzero(dones):
+                infos[i]["terminal_observation"] = states[i]
+            self.resetCars(dones)
+            states[dones] = self.getObservations()[dones]
+        self.updateFPS()
+        return states, rewards.astype(np.float32), dones, infos
+
+    def step(self, actions):
+        """
+            Perform one action per car. See step_wait for the returned values
+        """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def updateFPS(self):
+        """
+            Keep track of the steps of the last second
+        """
+        t = time.perf_counter()
+        self._step_times.append(t)
+        while t - self._step_times[0] > 1:
+            self._step_times.popleft()
+
+    def getFPS(self):
+        """
+            Return the number of steps performed in the last second by each car
+        """
+        return [len(self._step_times)] * self.n_envs
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+class SimTMEnv:
+    """
+        Simulated environment with the same API as TMEnv. If you want to instanciate this, you can use MakeTMEnv(simulated=True)
+    """
+    def __init__(self, include_time_left=True, realtime=False, profiler=None, **simulator_params):
+        """
+            params:
+                include_time_left (boolean): Wether the states should contain time left before timeout
+                realtime (boolean): Wether the steps should be paced according to ENV_MAX_FPS like the real environment. Otherwise they run as fast as possible
+                profiler (StepProfiler): If provided, the phases of the steps and resets are timed, returned in the info dict and summarized at the end of each episode
+                simulator_params: Parameters of the TrackSimulator
+        """
+        self.vec_env = SimVecTMEnv(1, include_time_left, realtime, **simulator_params)
+        self.profiler = profiler
+        self.controller = self.vec_env.controller
+        self.done = False
+        self.wait_hook = None
+        self.wait_hook_with_budget = False
+
+    def attachToWaitHook(self, func, with_budget=False):
+        """
+            Attach "func" to the waiting hook. func will be called during each step
+            func is called with the time left before the next tick in seconds if with_budget is True, None when the steps aren't paced
+        """
+        self.wait_hook = func
+        self.wait_hook_with_budget = with_budget
+
+    def getFPS(self):
+        """
+            Return the number of steps performed in the last second
+        """
+        return self.vec_env.getFPS()[0]
+
+    def getTime(self):
+        """
+            Return the simulated time of the current run in milliseconds
+        """
+        return int(self.vec_env.simulator.run_time[0] * 1000)
+
+    def getObservation(self):
+        """
+            Return the current state. Same format as TMEnv.getObservation
+        """
+        return self.vec_env.getObservations()[0]
+
+    def reset(self):
+        """
+            Reset the run
+        """
+        if self.profiler is not None:
+            self.profiler.start()
+        self.done = False
+        state = self.vec_env.reset()[0]
+        if self.profiler is not None:
+            self.profiler.mark("reset_simulation")
+        return state
+
+    def step(self, action):
+        """
+            Perform an action and return the new state of the simulation. Same returned values as TMEnv.step
+        """
+        if self.done:
+            return None
+        self.step_async(action)
+        if self.wait_hook is not None:
+            if self.wait_hook_with_budget:
+                scheduler = self.vec_env.scheduler
+                self.wait_hook(scheduler.getTimeBeforeDeadline() if scheduler is not None else None)
+            else:
+                self.wait_hook()
+        return self.step_wait()
+
+    def step_async(self, action):
+        """
+            First half of step: store the action
+        """
+        if self.done:
+            raise Exception("The episode is finished, call reset() before stepping again")
+        if self.profiler is not None:
+            self.profiler.start()
+        self.controller.performAction(action)
+        self.vec_env.step_async([action])
+        if self.profiler is not None:
+            self.profiler.mark("action")
+
+    def step_wait(self):
+        """
+            Second half of step: simulate the step and return its result. See TMEnv.step for the returned values
+        """
+        if self.profiler is not None:
+            # Time spent in the wait hook or by the caller between step_async and step_wait
+            self.profiler.mark("wait_hook")
+        states, rewards, dones, infos = self.vec_env.step_wait()
+        info = infos[0]
+        self.done = bool(dones[0])
+        # Like TMEnv, the terminal state is returned and the next episode starts with reset()
+        state = info.pop("terminal_observation") if self.done else states[0]
+        if self.profiler is not None:
+            self.profiler.mark("simulation")
+            info["profile"] = self.profiler.getLast()
+            if self.done:
+                print(self.profiler.summary())
+        return state, float(rewards[0]), self.done, info
@@ -0,0 +1,70 @@
+"""
+
+    Low-overhead profiler timing the phases of the environment's steps and resets
+
+"""
+
+import time
+import numpy as np
+
+class StepProfiler:
+    """
+        Low-overhead profiler timing the phases of the environment's steps and resets.
+        Each phase keeps a rolling window of its durations in a preallocated array, percentiles are only computed on demand
+    """
+    def __init__(self, window=1000):
+        """
+            params:
+                window: Number of durations kept per phase to compute the rolling percentiles
+        """
+        self.window = window
+        self._durations = {}
+        self._counts = {}
+        # Durations of the phases of the current sequence only
+        self._last_durations = {}
+        self._last_time = None
+
+    def start(self):
+        """
+            Start timing a new sequence of phases. The durations of the previous sequence are forgotten
+        """
+        self._last_durations = {}
+        self._last_time = time.perf_counter()
+
+    def mark(self, phase):
+        """
+            Close the phase "phase": its duration is the time elapsed since the previous mark (or start)
+        """
+        t = time.perf_counter()
+        duration = t - self._last_time
+        self._last_time = t
+        durations = self._durations.get(phase)
+        if durations is None:
+            durations = self._durations[phase] = np.zeros(self.window)
+            self._counts[phase] = 0
+        durations[self._counts[phase] % self.window] = duration
+        self._counts[phase] += 1
+        self._last_durations[phase] = duration
+
+    def getLast(self):
+        """
+            Return a dictionnary with the duration of each phase of the current sequence
+        """
+        return dict(self._last_durations)
+
+    def getPercentiles(self, phase, percentiles=(50, 95, 99)):
+        """
+            Return the given percentiles of the durations of a phase over the rolling window
+        """
+        durations = self._durations[phase][:min(self._counts[phase], self.window)]
+        return np.percentile(durations, percentiles)
+
+    def summary(self):
+        """
+            Return a string with the rolling p50/p95/p99 of each phase in milliseconds
+        """
+        lines = ["{:<20} {:>8} {:>9} {:>9} {:>9}".format("Phase", "Count", "p50 (ms)", "p95 (ms)", "p99 (ms)")]
+        for phase in self._durations:
+            p50, p95, p99 = self.getPercentiles(phase) * 1000
+            lines.append("{:<20} {:>8} {:>9.3f} {:>9.3f} {:>9.3f}".format(phase, self._counts[phase], p50, p95, p99))
+        return "\n".join(lines)
@@ -0,0 +1,116 @@
+"""
+
+    Deadline-based scheduler pacing the steps of the environment
+
+"""
+
+import time
+from bisect import bisect_right
+from collections import deque
+
+# Upper bounds (in milliseconds) of the buckets of the jitter and overrun histograms
+HISTOGRAM_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, float("inf")]
+
+class StepScheduler:
+    """
+        Deadline-based scheduler pacing the steps of the environment.
+        Ticks target absolute deadlines on a monotonic clock so that oversleeping or a slow step doesn't accumulate into a drift.
+    """
+    def __init__(self, fps, spin_duration=0.001):
+        """
+            params:
+                fps: Number of ticks per second to target
+                spin_duration: Duration of the end of the wait spent spinning instead of sleeping. Improves the precision of the ticks at the cost of some CPU
+        """
+        self.period = 1 / fps
+        self.spin_duration = spin_duration
+        self._next_deadline = None
+        # Timestamps of the ticks of the last second
+        self._tick_times = deque()
+        # Statistics
+        self.n_ticks = 0
+        self.n_waits = 0
+        self.n_overruns = 0
+        self.jitter_sum = 0
+        self.jitter_max = 0
+        self.jitter_histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+        self.overrun_histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+
+    def start(self):
+        """
+            Start a new sequence of ticks from now. Return the timestamp of the start
+        """
+        t = time.perf_counter()
+        self._next_deadline = t + self.period
+        self._addTick(t)
+        return t
+
+    def getTimeBeforeDeadline(self):
+        """
+            Return the time left before the next tick (negative if the deadline is already passed)
+        """
+        if self._next_deadline is None:
+            return 0
+        return self._next_deadline - time.perf_counter()
+
+    def wait(self):
+        """
+            Wait for the next tick. Return the timestamp of the tick
+        """
+        if self._next_deadline is None:
+            return self.start()
+        deadline = self._next_deadline
+        delay = deadline - time.perf_counter()
+        if delay < 0:
+            # The step took longer than a period
+            self.n_overruns += 1
+            self.overrun_histogram[bisect_right(HISTOGRAM_BUCKETS_MS, -delay * 1000)] += 1
+        else:
+            # Sleep then spin for the last part of the wait
+            if delay > self.spin_duration:
+                time.sleep(delay - self.spin_duration)
+            while time.perf_counter() < deadline:
+                pass
+        t = time.perf_counter()
+        # Late by how much compared to the deadline
+        jitter = t - deadline
+        self.n_waits += 1
+        self.jitter_sum += jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+        self.jitter_histogram[bisect_right(HISTOGRAM_BUCKETS_MS, jitter * 1000)] += 1
+        # Small delays are compensated by the next tick. After a whole missed period the schedule restarts from now instead of bursting
+        self._next_deadline = deadline + self.period
+        if self._next_deadline < t:
+            self._next_deadline = t + self.period
+        self._addTick(t)
+        return t
+
+    def _addTick(self, t):
+        """
+            Keep track of the ticks of the last second
+        """
+        self.n_ticks += 1
+        self._tick_times.append(t)
+        while t - self._tick_times[0] > 1:
+            self._tick_times.popleft()
+
+    def getFPS(self):
+        """
+            Return the number of ticks in the last second
+        """
+        return len(self._tick_times)
+
+    def getStats(self):
+        """
+            Return the statistics of the scheduler: number of ticks, waits and overruns, mean/max jitter in seconds, and the jitter/overrun histograms.
+            The histograms are lists of (upper bound in ms, count)
+        """
+        return {
+            "n_ticks": self.n_ticks,
+            "n_waits": self.n_waits,
+            "n_overruns": self.n_overruns,
+            "jitter_mean": self.jitter_sum / max(self.n_waits, 1),
+            "jitter_max": self.jitter_max,
+            "jitter_histogram": list(zip(HISTOGRAM_BUCKETS_MS, self.jitter_histogram)),
+            "overrun_histogram": list(zip(HISTOGRAM_BUCKETS_MS, self.overrun_histogram))
+        }
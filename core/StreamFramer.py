@@ -0,0 +1,49 @@
+"""
+
+    Incremental framing of the stream of JSON messages sent by the openplanet script
+
+"""
+
+class StreamFramer:
+    """
+        Incremental framing of a stream of flat JSON objects sent back to back (e.g '{...}{...}{...').
+        The received bytes are accumulated in a reusable bytearray, only the newest complete message is returned
+        and the messages it supersedes are counted as skipped
+    """
+    def __init__(self, max_pending_size=65536):
+        """
+            params:
+                max_pending_size: Maximum number of bytes kept while waiting for the end of a message. Above that the pending data is considered corrupted and dropped
+        """
+        self.max_pending_size = max_pending_size
+        self._buffer = bytearray()
+        # Number of complete messages framed since the creation
+        self.n_messages = 0
+        # Number of complete messages superseded by a newer one before being returned
+        self.n_skipped = 0
+
+    def reset(self):
+        """
+            Drop the pending data. To call when the connection changes
+        """
+        del self._buffer[:]
+
+    def feed(self, data):
+        """
+            Add received bytes to the stream. Return the newest complete message (bytes) or None if there isn't any
+        """
+        self._buffer += data
+        end = self._buffer.rfind(b"}")
+        if end < 0:
+            if len(self._buffer) > self.max_pending_size:
+                self.reset()
+            return None
+        # The messages are flat JSON objects so each "}" closes exactly one message
+        n_complete = self._buffer.count(b"}", 0, end + 1)
+        start = self._buffer.rfind(b"{", 0, end)
+        message = bytes(self._buffer[start:end + 1]) if start >= 0 else None
+        # Keep only the beginning of the next message
+        del self._buffer[:end + 1]
+        self.n_messages += n_complete
+        self.n_skipped += n_complete - 1
+        return message
@@ -0,0 +1,18 @@
+"""
+
+    Base class for capture backends. To see an example of implementation go check in the "captures" folder
+
+"""
+
+class TMCapture:
+    """
+        Base class for capture backends. To see an example of implementation go check in the "captures" folder
+    """
+    def __init__(self):
+        pass
+
+    def getScreenshot(self):
+        """
+            Return a BGR image of the game (np.array of shape (H, W, 3)) and the timestamp it was taken at
+        """
+        raise Exception("getScreenshot not implemented by your capture backend")
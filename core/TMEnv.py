@@ -12,6 +12,8 @@ import time
 import config
 import numpy as np
 
+from core.StepScheduler import StepScheduler
+
 class TMEnv:
     """
         TMEnv internal class. If you want to instanciate this, please use the MakeTMEnv() api
@@ -26,7 +28,8 @@ class TMEnv:
             controller,
             blocking_mode,
             manual_override,
-            include_time_left
+            include_time_left,
+            profiler=None
         ):
         """
             params:
@@ -35,6 +38,8 @@ class TMEnv:
                 controller (TMDevice): Trackmania controller e.g keyboard / controller / joystick
                 blocking_mode (boolean): Wether the "reset" method of tmenv will block your code. Strongly advise you to let this to True
                 manual_override (boolean): Wether the user should be able to override the agent's actions when using a physicall device.
+                include_time_left (boolean): Wether the states should contain time left before timeout
+                profiler (StepProfiler): If provided, the phases of the steps and resets are timed, returned in the info dict and summarized at the end of each episode
         """
         # Handlers
         self.open_planet_bridge = open_planet_bridge
@@ -44,35 +49,38 @@ class TMEnv:
         self.blocking_mode = blocking_mode
         self.manual_override = manual_override
         self.include_time_left = include_time_left
+        self.profiler = profiler
         # Internal variables
         self.nCp = 0
         self.last_cp_time = None
         self.done = False
         self.state_acquisition_time = None
-        self.fps_buffer = []
+        # Pace the steps according to ENV_MAX_FPS
+        self.scheduler = StepScheduler(config.ENV_MAX_FPS, config.ENV_SPIN_WAIT)
         self.wait_hook = None
+        self.wait_hook_with_budget = False
+        # Action performed by step_async and waiting for step_wait
+        self._pending_step = None
 
-    def attachToWaitHook(self, func):
+    def attachToWaitHook(self, func, with_budget=False):
         """
             Attach "func" to the waiting hook. func will be called during the waiting phase of the environment's step
+            func is called with the time left before the next tick in seconds if with_budget is True
         """
         self.wait_hook = func
+        self.wait_hook_with_budget = with_budget
 
-    def FPSUpdate(self):
+    def getFPS(self):
         """
-            Notify that a new frame has been produced
+            Return the number of frames produced in the last second
         """
-        self.fps_buffer.append(time.time())
-        # Removes all frames older than 1 sec
-        t = time.time()
-        while t - self.fps_buffer[0] > 1:
-            self.fps_buffer.pop(0)
+        return self.scheduler.getFPS()
 
-    def getFPS(self):
+    def getSchedulerStats(self):
         """
-            Return the number of frames produced in the last second
+            Return the pacing statistics of the steps (overruns, jitter and their histograms). See StepScheduler.getStats
         """
-        return len(self.fps_buffer)
+        return self.scheduler.getStats()
 
     def getTime(self):
         """
@@ -88,13 +96,14 @@ class TMEnv:
         """
         # Make sure the game is in run
         self.assertIsInRun()
-        resp = self.tm_screen.getFrames(n_frames=config.CAPTURE_N_FRAMES)
+        # The observation is allocated once and the frames are copied straight into it
+        n_planes = config.CAPTURE_N_FRAMES + 1 if self.include_time_left else config.CAPTURE_N_FRAMES
+        frames = np.empty((n_planes,) + self.tm_screen.getFrameShape(), dtype=np.uint8)
+        resp = self.tm_screen.getFrames(n_frames=config.CAPTURE_N_FRAMES, out=frames[n_planes - config.CAPTURE_N_FRAMES:])
         if resp is None:
             raise Exception("Trackmania not detected")
-        frames, _ = resp
         if self.include_time_left:
-            time_left =  (np.ones((1,) + frames.shape[1:]) * int(round(time_left * 255))).astype(np.uint8)
-            frames = np.concatenate((time_left, frames), axis=0)
+            frames[0] = min(max(int(round(time_left * 255)), 0), 255)
 
         return frames
 
@@ -108,7 +117,7 @@ class TMEnv:
         if newCp > self.nCp:
             # We crossed a new CP
             self.nCp = newCp
-            self.last_cp_time = time.time()
+            self.last_cp_time = time.perf_counter()
             return config.ENV_CP_REWARD
         elif self.open_planet_bridge.isGameStateFinish():
             # We crossed the finish line
@@ -117,28 +126,58 @@ class TMEnv:
             # Nothing special happened
             return config.ENV_DEFAULT_REWARD
 
+    def getRestartDetector(self):
+        """
+            Return a function telling if a state received since this call shows that the run restarted.
+            The first states received after a reset can be older than the reset, so being in game isn't enough:
+            the game must have been out of a run, in the countdown, or its time must have gone back
+        """
+        sequence = self.open_planet_bridge.getSequence()
+        state = self.open_planet_bridge.getState()
+        time_before = state["time"] if state is not None else None
+        restarted = False
+        def hasRestarted():
+            nonlocal restarted
+            if not restarted and self.open_planet_bridge.getSequence() > sequence:
+                state = self.open_planet_bridge.getState()
+                restarted = not state["in_game"] or state["time"] < 0 or (time_before is not None and state["time"] < time_before)
+            return restarted
+        return hasRestarted
+
     def reset(self):
         """
             Reset the environment. Note that this reset the run in-game. 
             Warning: this is a blocking function by default.
         """
+        if self.profiler is not None:
+            self.profiler.start()
         # In-game reset of the run
+        has_restarted = self.getRestartDetector()
         self.controller.reset()
         self.done = False
+        self._pending_step = None
+        if self.profiler is not None:
+            self.profiler.mark("reset_controller")
         # In-game reset of the run
         if self.blocking_mode:
-            while True:
-                time.sleep(0.5)
-                if self.open_planet_bridge.isInGame():
-                    break
+            # Return as soon as a state received after the reset says the run restarted and started
+            while not self.open_planet_bridge.waitFor(
+                    lambda: has_restarted() and self.open_planet_bridge.isInGame(),
+                    timeout=config.ENV_RESET_TIMEOUT
+                ):
+                has_restarted = self.getRestartDetector()
                 self.controller.reset()
+        if self.profiler is not None:
+            self.profiler.mark("reset_wait")
         # Reset the internal state
         self.nCp = 0
-        self.last_cp_time = time.time()
-        self.FPSUpdate()
-        self.state_acquisition_time = time.time()
+        self.last_cp_time = time.perf_counter()
+        self.state_acquisition_time = self.scheduler.start()
         # Return the initial state
-        return self.getObservation()
+        state = self.getObservation()
+        if self.profiler is not None:
+            self.profiler.mark("reset_observation")
+        return state
 
     def step(self, action):
         """
@@ -158,9 +197,37 @@ class TMEnv:
                         is_finished: Boolean saying if the finish line was crossed
                         action_latency: The estimated time passed between the moment at which the frame of the previous state was captured
                                         and the moment  at which the given action was performed in-game
+                        prop_before_timeout: Proportion of ENV_PLAYING_TIMEOUT left before the timeout
+                        profile: (Only with a profiler) Duration of each phase of the step
         """
         if self.done:
             return None
+        self.step_async(action)
+
+        # Call the waiting hook
+        if self.wait_hook is not None:
+            if self.wait_hook_with_budget:
+                self.wait_hook(self.scheduler.getTimeBeforeDeadline())
+            else:
+                self.wait_hook()
+
+        return self.step_wait()
+
+    def step_async(self, action):
+        """
+            First half of step: perform the action and return immediately. The caller can then run inference, training or logging
+            while the environment waits for its next tick, and must call step_wait to get the result of the step.
+            The wait hook is not called in that case
+
+            params:
+                action: The action to perform.
+        """
+        if self.done:
+            raise Exception("The episode is finished, call reset() before stepping again")
+        if self._pending_step is not None:
+            raise Exception("step_async called twice without step_wait")
+        if self.profiler is not None:
+            self.profiler.start()
         # Make sure the game is in run
         self.assertIsInRun()
         performed_action = action
@@ -174,28 +241,42 @@ class TMEnv:
                 self.controller.performAction(action)
         else:
             self.controller.performAction(action)
-        action_latency = time.time() - self.state_acquisition_time
+        action_latency = time.perf_counter() - self.state_acquisition_time
+        self._pending_step = (performed_action, action_latency)
+        if self.profiler is not None:
+            self.profiler.mark("action")
 
-        # Call the waiting hook
-        if self.wait_hook is not None:
-            self.wait_hook()
+    def step_wait(self):
+        """
+            Second half of step: wait for the next tick and return the new state of the game. See step for the returned values
+        """
+        if self._pending_step is None:
+            raise Exception("step_wait called without step_async")
+        performed_action, action_latency = self._pending_step
+        self._pending_step = None
+        if self.profiler is not None:
+            # Time spent in the wait hook or by the caller between step_async and step_wait
+            self.profiler.mark("wait_hook")
 
         # Respect the max FPS limit
-        t = time.time()
-        dt = t - self.fps_buffer[-1]
-        if dt < 1 / config.ENV_MAX_FPS:
-            time.sleep(1 / config.ENV_MAX_FPS - dt)
+        tick_time = self.scheduler.wait()
+        if self.profiler is not None:
+            self.profiler.mark("sleep")
 
         # Calculate the returned informations
         reward = self.calculateReward()
+        if self.profiler is not None:
+            self.profiler.mark("reward")
         done = self.open_planet_bridge.isGameStateFinish()
         if config.ENV_PLAYING_TIMEOUT > 0:
-            time_before_timeout = config.ENV_PLAYING_TIMEOUT - (time.time() - self.last_cp_time)
+            time_before_timeout = config.ENV_PLAYING_TIMEOUT - (tick_time - self.last_cp_time)
             done = done or time_before_timeout <= 0
             prop_before_timeout = time_before_timeout / config.ENV_PLAYING_TIMEOUT
         else:
             prop_before_timeout = 1
         state = self.getObservation(prop_before_timeout)
+        if self.profiler is not None:
+            self.profiler.mark("observation")
             
         self.done = done
 
@@ -203,14 +284,18 @@ class TMEnv:
             # Make sure we release all keys
             self.controller.releaseEverything()
 
-        self.FPSUpdate()
-        self.state_acquisition_time = time.time()
-        return state, reward, done, {
+        self.state_acquisition_time = tick_time
+        info = {
             "performed_action": performed_action,
             "is_finished": self.open_planet_bridge.isGameStateFinish(),
             "action_latency": action_latency,
             "prop_before_timeout": prop_before_timeout
         }
+        if self.profiler is not None:
+            info["profile"] = self.profiler.getLast()
+            if self.done:
+                print(self.profiler.summary())
+        return state, reward, done, info
 
     def assertIsInRun(self):
         """
@@ -16,7 +16,8 @@ class TMForgeUI:
         The ui will not appear on the game capture.
     """
     def __init__(self):
-        pass
+        # The window is placed when it's shown for the first time
+        self.placed = False
 
     def draw(self, screen):
         """
@@ -24,15 +25,17 @@ class TMForgeUI:
                 screen: np.array representing the image of the ui
         """
         cv2.imshow(windowName, screen)
-        # Move the window under the openplanet control bar
-        cv2.moveWindow(
-            windowName,
-            10, 40
-        )
-        # Brinf the ui window to front to be over the trackmania window
-        cv2.setWindowProperty(windowName, cv2.WND_PROP_TOPMOST, 1)
-        # Detect a push on the 'q' button to quit
-        if (cv2.waitKey(25) & 0xFF == ord('q')):
+        if not self.placed:
+            # Move the window under the openplanet control bar
+            cv2.moveWindow(
+                windowName,
+                10, 40
+            )
+            # Brinf the ui window to front to be over the trackmania window
+            cv2.setWindowProperty(windowName, cv2.WND_PROP_TOPMOST, 1)
+            self.placed = True
+        # Detect a push on the 'q' button to quit. Waits as little as possible, this runs in the waiting phase of the environment
+        if (cv2.waitKey(1) & 0xFF == ord('q')):
             cv2.destroyAllWindows()
             return False
         return True
\ No newline at end of file
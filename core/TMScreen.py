@@ -4,34 +4,44 @@
 
 """
 
-from collections import deque
 import threading
 import numpy as np
 import cv2
 import config
 
-from utils.WindowCapture import WindowCapture
+from core.FrameBuffer import FrameBuffer
 
 class TMScreen:
     """
         Handler for the screen capture
     """
-    def __init__(self, max_buffer_size=60):
+    def __init__(self, capture=None, max_buffer_size=60):
         """
             params:
+                capture (TMCapture): Capture backend. If None the Trackmania window is captured
                 max_buffer_size: Number of frames to keep track of
         """
         self.max_buffer_size = max_buffer_size
-        # Capture class
-        self.tm_capture = WindowCapture("Trackmania")
-        # Buffer
-        self.tm_frame_buffer = deque(maxlen=max_buffer_size)
-        # Keep track of the timestamp of the frames for sync
-        self.tm_frame_time_buffer = deque(maxlen=max_buffer_size)
+        # Capture class. The window capture is imported here because it relies on the windows api
+        if capture is None:
+            from captures.TMWindowCapture import TMWindowCapture
+            capture = TMWindowCapture("Trackmania")
+        self.tm_capture = capture
+        # Buffer. Keep track of the timestamp of the frames for sync
+        self.tm_frame_buffer = FrameBuffer(max_buffer_size, TMScreen.getFrameShape())
 
         self.is_capturing = False
         self._capture_thread = None
 
+    @staticmethod
+    def getFrameShape():
+        """
+            Return the shape of a captured frame according to config.py
+        """
+        if config.CAPTURE_GREYSCALE:
+            return (config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH)
+        return (config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH, 3)
+
     def capture(self):     
         """
             Create the screen capture thread
@@ -50,16 +60,20 @@ class TMScreen:
         """
             Take continuously screenshots of the game
         """
+        # Intermediate image used for the greyscale conversion
+        resized = np.empty((config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH, 3), dtype=np.uint8)
         while self.is_capturing:
             # Take screenshot
-            screen, time = self.tm_capture.get_screenshot()
-            # Resize it
-            screen = cv2.resize(screen, (config.CAPTURE_IMG_WIDTH, config.CAPTURE_IMG_HEIGHT))
+            screen, time = self.tm_capture.getScreenshot()
+            # Resize it directly in the buffer
+            slot = self.tm_frame_buffer.getWriteSlot()
             if config.CAPTURE_GREYSCALE:
-                screen = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
-            # stores it in the buffer
-            self.tm_frame_buffer.append(screen)
-            self.tm_frame_time_buffer.append(time)
+                cv2.resize(screen, (config.CAPTURE_IMG_WIDTH, config.CAPTURE_IMG_HEIGHT), dst=resized)
+                cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY, dst=slot)
+            else:
+                cv2.resize(screen, (config.CAPTURE_IMG_WIDTH, config.CAPTURE_IMG_HEIGHT), dst=slot)
+            # Publish it
+            self.tm_frame_buffer.commit(time)
 
     def stop(self):
         """
@@ -76,14 +90,17 @@ class TMScreen:
 
         return True
 
-    def getFrames(self, n_frames=1):
+    def waitFor(self, predicate, timeout=None):
+        """
+            Block until "predicate" returns True. The predicate is checked each time a new frame is captured.
+            Return the last value of the predicate (False if the timeout expired)
+        """
+        return self.tm_frame_buffer.waitFor(predicate, timeout)
+
+    def getFrames(self, n_frames=1, out=None):
         """
-            Return the last "n_frames" frames of the buffer and their associated timestamp 
+            Return the last "n_frames" frames of the buffer and their associated timestamp or None if there isn't enough frames.
+            If "out" is provided the frames are copied into it, otherwise a read-only view of the buffer is returned
+            (valid until "max_buffer_size - n_frames" new frames are captured)
         """
-        n = len(self.tm_frame_buffer)
-        if n_frames <= n:
-            frames = [self.tm_frame_buffer[i] for i in range(n - n_frames, n)]
-            frames = np.stack(frames, axis=0)
-            times = [self.tm_frame_time_buffer[i] for i in range(n - n_frames, n)]
-            return frames, times
-        return None
\ No newline at end of file
+        return self.tm_frame_buffer.getLast(n_frames, out=out)
\ No newline at end of file
@@ -1,39 +1,99 @@
 """
 
     Telemetry wrapper you can use to handle your metrics.
-    Stores the data you append to it in memory and in a csv file
+    Stores the data you append to it in memory and in a csv file, or in binary chunks (see ChunkedTelemetry).
+    The rows are written to the file in batches by a background thread
 
 """
 
 import numpy as np
 import pandas as pd
 from shutil import copyfile
+import atexit
 import os
+import threading
+import time
+
+from core.MetricColumn import MetricColumn
+from core.ChunkedTelemetry import ChunkedTelemetryWriter, ChunkedTelemetryReader, getTailPath
 
 class Telemetry:
     """
         Telemetry wrapper you can use to handle your metrics.
     """
-    def __init__(self, metrics, dump_file_path="metrics.csv"):
+    def __init__(self, metrics, dump_file_path="metrics.csv", flush_rows=256, flush_interval=5, format="csv", rollups=None):
         """
             params:
                 metrics: list of the name of the metrics you want to keep track of
                 dump_file_path: File in which you want to write the data
+                flush_rows: Number of pending rows that triggers a write of the file
+                flush_interval: Maximum time in seconds a row stays in memory before being written
+                format: "csv" to write the rows in dump_file_path,
+                        "binary" to write them in chunks in the directory <dump_file_path without extension>_chunks
+                rollups: list of TelemetryRollup summarizing the metrics at lower resolutions.
+                         Each one is written in <dump_file_path without extension>_<rollup name>.csv
         """
+        if format not in ("csv", "binary"):
+            raise Exception("Unknown telemetry format: " + str(format))
         self.dump_file_path = dump_file_path
         self.metrics = metrics
-        # The actual data
-        self._data = {k: [] for k in metrics}
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.format = format
+        # Writer of the binary chunks
+        self.chunked = None
+        # Tail files referenced by the last backups, the older ones are deleted
+        self._backup_tails = []
+        # The actual data, one MetricColumn per metric
+        self._data = {k: MetricColumn() for k in metrics}
+        self.rollups = {rollup.name: rollup for rollup in (rollups or [])}
+        # Size of the dump file when the last backup was made
+        self.backup_size = 0
+        # Lines of the csv file or sealed chunks not written yet, and (path, line) of the rollups
+        self._pending = []
+        self._pending_rollups = []
+        # Held while the pending lines are swapped, and while the file is written
+        self._pending_lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._error = None
+        # Time spent in append by the caller and in the writes by the background thread, to report the overhead
+        self.n_rows = 0
+        self.append_time = 0
+        self.n_flushes = 0
+        self.flush_time = 0
         # Create the file
         self.createDumpFile()
+        # Background thread writing the pending lines
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        # The pending lines are written even if the program exits without closing the telemetry
+        atexit.register(self.close)
 
     def createDumpFile(self):
         """
-            Create a csv file to dump the data in
+            Create a csv file to dump the data in, or the directory of the binary chunks
         """
-        if not os.path.isfile(self.dump_file_path):
+        if self.format == "binary":
+            self.chunked = ChunkedTelemetryWriter(self.getChunksDirectory(), self.metrics)
+        elif not os.path.isfile(self.dump_file_path):
             with open(self.dump_file_path, 'w') as f:
                 f.write(",".join(self.metrics) + "\n")
+        for rollup in self.rollups.values():
+            rollup.attach(self.metrics, self.getRollupPath(rollup.name))
+
+    def getChunksDirectory(self):
+        """
+            Return the directory of the binary chunks
+        """
+        return os.path.splitext(self.dump_file_path)[0] + "_chunks"
+
+    def getRollupPath(self, name):
+        """
+            Return the csv file of a rollup
+        """
+        return os.path.splitext(self.dump_file_path)[0] + "_" + name + ".csv"
 
     def append(self, new_row):
         """
@@ -41,41 +101,282 @@ class Telemetry:
                 new_row (Dict):
                     append a new Row to the data. Missing values and np.NaNs will be ignored in the data and blank_spaces in the csv file
         """
-        new_str_values= []
+        tstart = time.perf_counter()
+        timestamp = time.time()
+        # The rollups close their bucket before the values of a row starting a new one are added
+        for rollup in self.rollups.values():
+            line = rollup.update(new_row, timestamp, self._data)
+            if line is not None:
+                with self._pending_lock:
+                    self._pending_rollups.append((rollup.dump_file_path, line))
+        new_values= []
         for m in self.metrics:
-            v = new_row.get(m, np.NaN)
-            new_str_values.append("" if np.isnan(v) else str(v))
-            if not np.isnan(v):
-                self._data[m].append(v)
-        # Write the new line
-        with open(self.dump_file_path, 'a') as f:
-            f.write(",".join(new_str_values) + "\n")
+            v = new_row.get(m)
+            # v != v is True for NaNs only and is much cheaper than np.isnan on scalars
+            if v is None or v != v:
+                new_values.append(np.nan if self.chunked is not None else "")
+            else:
+                new_values.append(v if self.chunked is not None else str(v))
+                self._data[m].append(v, timestamp)
+        if self.chunked is not None:
+            # The chunk is written by the background thread once it's full
+            chunk = self.chunked.append(new_values, timestamp)
+            if chunk is not None:
+                with self._pending_lock:
+                    self._pending.append(chunk)
+                self._wake.set()
+        else:
+            # The line is written later by the background thread
+            with self._pending_lock:
+                self._pending.append(",".join(new_values) + "\n")
+                n_pending = len(self._pending)
+            if n_pending >= self.flush_rows:
+                self._wake.set()
+        self.n_rows += 1
+        self.append_time += time.perf_counter() - tstart
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.writePending()
+            except Exception as e:
+                self._error = e
+
+    def writePending(self, sync=False):
+        """
+            Write the pending lines at the end of the dump file, or the pending chunks
+
+            params:
+                sync (boolean): Wether to wait for the data to be on the disk
+        """
+        with self._file_lock:
+            with self._pending_lock:
+                lines, self._pending = self._pending, []
+                rollup_lines, self._pending_rollups = self._pending_rollups, []
+            if len(lines) == 0 and len(rollup_lines) == 0 and not sync:
+                return
+            tstart = time.perf_counter()
+            if self.chunked is not None:
+                for chunk in lines:
+                    self.chunked.writeChunk(chunk, sync)
+            else:
+                with open(self.dump_file_path, 'a') as f:
+                    f.writelines(lines)
+                    if sync:
+                        f.flush()
+                        os.fsync(f.fileno())
+            for path in set(path for path, _ in rollup_lines):
+                with open(path, 'a') as f:
+                    f.writelines(line for line_path, line in rollup_lines if line_path == path)
+                    if sync:
+                        f.flush()
+                        os.fsync(f.fileno())
+            self.n_flushes += 1
+            self.flush_time += time.perf_counter() - tstart
+
+    def raiseError(self):
+        """
+            Raise the error of a failed background write if there is one
+        """
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise Exception("Telemetry write failed") from error
+
+    def flush(self):
+        """
+            Write every appended row to the disk before returning
+        """
+        self.raiseError()
+        self.writePending(sync=True)
+
+    def close(self):
+        """
+            Write the remaining rows and stop the background thread
+        """
+        if self._running:
+            self._running = False
+            self._wake.set()
+            self._thread.join()
+            atexit.unregister(self.close)
+            # The last buckets are summarized even if they aren't complete
+            for rollup in self.rollups.values():
+                if rollup.key is not None:
+                    self._pending_rollups.append((rollup.dump_file_path, rollup.seal(self._data)))
+                    rollup.key = None
+        self.flush()
+        if self.chunked is not None:
+            # The rows of the last chunk, so that the readers see every row
+            start, values, timestamps = self.chunked.getTail()
+            ChunkedTelemetryWriter.saveTail(getTailPath(self.chunked.directory, start), values, timestamps)
+
+    def getOverhead(self):
+        """
+            Return the cost of the telemetry: mean time spent in append per row and in the background writes per row, in seconds
+        """
+        n_rows = max(self.n_rows, 1)
+        return {
+            "rows": self.n_rows,
+            "flushes": self.n_flushes,
+            "append_time_per_row": self.append_time / n_rows,
+            "write_time_per_row": self.flush_time / n_rows
+        }
 
     def get(self, column):
         """
-            Return the colun having the name specified by the "column" argument
+            Return the colun having the name specified by the "column" argument, as a MetricColumn
         """
         return self._data[column]
 
+    def getLast(self, column, n):
+        """
+            Return the last "n" values of the column as a NumPy array
+        """
+        return self._data[column].getLast(n)
+
+    def getSince(self, column, t):
+        """
+            Return the values of the column appended at or after the timestamp "t" (seconds since epoch) as a NumPy array
+        """
+        return self._data[column].getSince(t)
+
+    def getStats(self, column):
+        """
+            Return the running count, mean, min and max of the column
+        """
+        return self._data[column].getStats()
+
+    def getRollup(self, name, column, stat):
+        """
+            Return the "stat" (min, mean, max or last) of "column" for each finished bucket of the rollup "name", as a MetricColumn
+        """
+        return self.rollups[name].get(column, stat)
+
     def setState(self, state):
-        self.dump_file_path = state["dump_file_path"]
-        copyfile(state["backup_path"], self.dump_file_path)
+        if state.get("format", "csv") == "binary":
+            self.setChunkedState(state)
+        else:
+            self.setCsvState(state)
+        for name, rollup_state in state.get("rollups", {}).items():
+            if name in self.rollups:
+                self.rollups[name].setState(rollup_state, self.metrics)
+
+    def setCsvState(self, state):
+        """
+            Restore a backup of the csv format
+        """
+        # The rows appended before the restoration are dropped with the file they would be written to
+        with self._file_lock:
+            with self._pending_lock:
+                self._pending = []
+            self.dump_file_path = state["dump_file_path"]
+            copyfile(state["backup_path"], self.dump_file_path)
+            # The backup file is appended in place, drop the rows of a later copy that may have been interrupted
+            if "backup_size" in state:
+                os.truncate(self.dump_file_path, state["backup_size"])
         data = pd.read_csv(self.dump_file_path)
 
         self.metrics = list(data.columns)
         self._data = {}
         for k in self.metrics:
             col = data[k].values
-            self._data[k] = col[col == col].tolist()
+            col = col[col == col]
+            # The time the restored values were appended isn't saved: they are older than any new value
+            self._data[k] = MetricColumn()
+            self._data[k].extend(col, np.zeros(len(col)))
+        self.backup_size = os.path.getsize(self.dump_file_path)
 
+    def setChunkedState(self, state):
+        """
+            Restore a backup of the binary format: the chunks sealed after the backup are dropped and the columns are read
+            from the memory-mapped files, the backed up tail becomes the chunk being filled
+        """
+        with self._file_lock:
+            with self._pending_lock:
+                self._pending = []
+            self.format = "binary"
+            self.dump_file_path = state["dump_file_path"]
+            self.metrics = ChunkedTelemetryReader(state["directory"]).metrics
+            self.chunked = ChunkedTelemetryWriter(state["directory"], self.metrics)
+            self.chunked.truncate(state["n_chunks"])
+        reader = ChunkedTelemetryReader(state["directory"])
+        tail_values, tail_timestamps = reader.getTail(state["tail_path"])
+        tail_values, tail_timestamps = tail_values[:state["tail_rows"]], tail_timestamps[:state["tail_rows"]]
+        self.chunked.setTail(tail_values, tail_timestamps)
+        timestamps = np.concatenate([reader.getTimestamps(), tail_timestamps])
+        self._data = {}
+        for i, k in enumerate(self.metrics):
+            col = np.concatenate([reader.get(k), tail_values[:, i]])
+            valid = col == col
+            col = col[valid]
+            # Every value is stored as float64, the integer metrics get their type back
+            if np.array_equal(col, np.round(col)):
+                col = col.astype(np.int64)
+            self._data[k] = MetricColumn()
+            self._data[k].extend(col, timestamps[valid])
+        self._backup_tails = [state["tail_path"]]
+
+
+    def copyNewRows(self, start, end):
+        """
+            Copy the bytes between "start" and "end" of the dump file at the same place in the backup file
+        """
+        with open(self.dump_file_path, 'rb') as src, open("./metrics_backup.csv", 'r+b' if start > 0 else 'wb') as dst:
+            src.seek(start)
+            dst.seek(start)
+            dst.truncate()
+            dst.write(src.read(end - start))
+
+    def getState(self, writer=None):
+        """
+            Return the internal state for backup. Only the rows appended since the previous backup are copied
+
+            params:
+                writer: BackgroundWriter. If given, the copy is done on its thread
+        """
+        overhead = self.getOverhead()
+        print("Saving telemetry ({} rows, {:.1f}us per append, {:.1f}us of background writes per row)".format(
+            overhead["rows"], overhead["append_time_per_row"] * 1e6, overhead["write_time_per_row"] * 1e6
+        ))
+        # Every row appended until now is part of the backup, rows appended after this point belong to the next one
+        self.flush()
+        rollups = {name: rollup.getState() for name, rollup in self.rollups.items()}
+        if self.chunked is not None:
+            return dict(self.getChunkedState(writer), rollups=rollups)
+        end = os.path.getsize(self.dump_file_path)
+        if writer is None:
+            self.copyNewRows(self.backup_size, end)
+        else:
+            writer.submit(self.copyNewRows, self.backup_size, end)
+        self.backup_size = end
+        return {
+            "dump_file_path": self.dump_file_path,
+            "backup_path": "./metrics_backup.csv",
+            "backup_size": end,
+            "rollups": rollups
+        }
 
-    def getState(self):
+    def getChunkedState(self, writer=None):
         """
-            Return the internal state for backup
+            Return the internal state for backup in the binary format. The sealed chunks are already on the disk,
+            the backup only saves the rows of the chunk being filled
         """
-        print("Saving telemetry")
-        copyfile(self.dump_file_path, "./metrics_backup.csv")
+        start, values, timestamps = self.chunked.getTail()
+        tail_path = getTailPath(self.chunked.directory, start)
+        # The tail files of the backups before the previous one aren't needed anymore
+        obsolete_tails = [path for path in self._backup_tails[:-1] if path != tail_path]
+        self._backup_tails = [path for path in self._backup_tails[-1:] if path != tail_path] + [tail_path]
+        for job in [(ChunkedTelemetryWriter.saveTail, tail_path, values, timestamps)] + [(os.remove, path) for path in obsolete_tails]:
+            if writer is None:
+                job[0](*job[1:])
+            else:
+                writer.submit(*job)
         return {
+            "format": "binary",
             "dump_file_path": self.dump_file_path,
-            "backup_path": "./metrics_backup.csv"
-        }
\ No newline at end of file
+            "directory": self.chunked.directory,
+            "n_chunks": start // self.chunked.chunk_rows,
+            "tail_path": tail_path,
+            "tail_rows": len(values)
+        }
@@ -0,0 +1,137 @@
+"""
+
+    Downsampled view of the telemetry: min/mean/max/last of every metric per bucket of rows (per episode, per minute, ...)
+
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from core.MetricColumn import MetricColumn
+
+STATS = ("min", "mean", "max", "last")
+
+class TelemetryRollup:
+    """
+        Group the rows of a Telemetry in consecutive buckets and keep the min/mean/max/last of every metric per bucket.
+        The bucket of a row is the value of "key_column" divided by "width", or its timestamp divided by "width" when there is no key column.
+        A bucket is summarized when the next one starts, from the values appended to the MetricColumns of the Telemetry since it started,
+        so the rows are not processed one by one
+    """
+    def __init__(self, name, key_column=None, width=1):
+        """
+            params:
+                name: Name of the rollup, used in the name of its csv file
+                key_column: Metric identifying the bucket of a row. None to use the time at which the row was appended
+                width: Number of key values (or seconds) per bucket
+        """
+        self.name = name
+        self.key_column = key_column
+        self.width = width
+        self.metrics = None
+        self.dump_file_path = None
+        # Key of the current bucket and lengths of the MetricColumns when it started
+        self.key = None
+        self.start = None
+        # Summaries of the finished buckets: "key" and one MetricColumn per metric and stat
+        self.keys = MetricColumn()
+        self.columns = {}
+
+    def attach(self, metrics, dump_file_path):
+        """
+            Set the metrics to summarize and the csv file of the summaries, created if needed
+        """
+        self.metrics = list(metrics)
+        self.dump_file_path = dump_file_path
+        self.columns = {m: {stat: MetricColumn() for stat in STATS} for m in self.metrics}
+        if not os.path.isfile(self.dump_file_path):
+            with open(self.dump_file_path, 'w') as f:
+                f.write(",".join(["key"] + ["{} {}".format(m, stat) for m in self.metrics for stat in STATS]) + "\n")
+
+    def getKey(self, row, timestamp):
+        """
+            Return the key of the bucket of a row, or None if the row doesn't tell
+        """
+        if self.key_column is None:
+            return int(timestamp // self.width)
+        v = row.get(self.key_column)
+        if v is None or v != v:
+            return None
+        return int(v // self.width)
+
+    def update(self, row, timestamp, data):
+        """
+            Called by Telemetry before the values of a row are appended to the MetricColumns "data".
+            Return the csv line of the bucket finished by this row, or None
+        """
+        key = self.getKey(row, timestamp)
+        if key is None or key == self.key:
+            return None
+        line = self.seal(data) if self.key is not None else None
+        self.key = key
+        self.start = {m: len(data[m]) for m in self.metrics}
+        return line
+
+    def seal(self, data):
+        """
+            Summarize the current bucket and return its csv line
+        """
+        self.keys.append(self.key, 0)
+        values = [str(self.key)]
+        for m in self.metrics:
+            column = data[m]
+            start, end = self.start[m], len(column)
+            if start == end:
+                values += [""] * len(STATS)
+                continue
+            bucket = column.getRange(start, end)
+            stats = {"min": bucket.min(), "mean": bucket.mean(), "max": bucket.max(), "last": bucket[-1]}
+            for stat in STATS:
+                self.columns[m][stat].append(stats[stat], 0)
+                values.append(str(stats[stat]))
+        return ",".join(values) + "\n"
+
+    def get(self, metric, stat):
+        """
+            Return the "stat" (min, mean, max or last) of "metric" for each finished bucket having values, as a MetricColumn
+        """
+        return self.columns[metric][stat]
+
+    def getKeys(self):
+        """
+            Return the keys of the finished buckets as a MetricColumn
+        """
+        return self.keys
+
+    def getState(self):
+        """
+            Return the internal state for backup. The csv file must be flushed
+        """
+        return {
+            "dump_file_path": self.dump_file_path,
+            "size": os.path.getsize(self.dump_file_path),
+            "key": self.key,
+            "start": self.start
+        }
+
+    def setState(self, state, metrics):
+        """
+            Drop the buckets finished after the backup from the csv file and reload the summaries from it
+        """
+        self.metrics = list(metrics)
+        self.dump_file_path = state["dump_file_path"]
+        os.truncate(self.dump_file_path, state["size"])
+        self.key = state["key"]
+        self.start = state["start"]
+        data = pd.read_csv(self.dump_file_path)
+        self.keys = MetricColumn()
+        self.keys.extend(data["key"].values, np.zeros(len(data)))
+        self.columns = {}
+        for m in self.metrics:
+            self.columns[m] = {}
+            for stat in STATS:
+                col = data["{} {}".format(m, stat)].values if "{} {}".format(m, stat) in data else np.empty(0)
+                col = col[col == col]
+                self.columns[m][stat] = MetricColumn()
+                self.columns[m][stat].extend(col, np.zeros(len(col)))
@@ -0,0 +1,228 @@
+"""
+
+    Pure NumPy toy driving simulator. Simulates a batch of cars on a closed track with checkpoints and a finish line
+    and renders top-down greyscale frames. Used by the simulated environments (SimTMEnv)
+
+"""
+
+import numpy as np
+import cv2
+import config
+
+# (throttle, steering) of each action. Same order as TM_KEYBOARD_ACTIONS: nothing, →, ←, ↓, ↑, ↑→, ↑←
+SIM_ACTIONS = np.array([
+    [0, 0],
+    [0, 1],
+    [0, -1],
+    [-1, 0],
+    [1, 0],
+    [1, 1],
+    [1, -1]
+], dtype=np.float64)
+
+# Map colors
+GRASS_COLOR = 40
+ROAD_COLOR = 120
+CHECKPOINT_COLOR = 200
+CAR_COLOR = 255
+
+class TrackSimulator:
+    """
+        Pure NumPy toy driving simulator. Every operation is vectorized over the batch of cars
+    """
+    def __init__(self,
+            n_cars=1,
+            n_checkpoints=3,
+            track_radius=100,
+            track_width=12,
+            meters_per_pixel=0.5,
+            n_substeps=4,
+            seed=0
+        ):
+        """
+            params:
+                n_cars: Number of cars simulated in parallel
+                n_checkpoints: Number of checkpoints between the start and the finish line
+                track_radius: Mean radius of the loop (in meters)
+                track_width: Width of the road (in meters)
+                meters_per_pixel: Scale of the rendered frames
+                n_substeps: Number of physics updates per step
+                seed: Seed of the track shape
+        """
+        self.n_cars = n_cars
+        self.n_checkpoints = n_checkpoints
+        self.track_width = track_width
+        self.meters_per_pixel = meters_per_pixel
+        self.n_substeps = n_substeps
+        self.dt = 1 / config.ENV_MAX_FPS
+        self.createTrack(track_radius, seed)
+        self.renderMap()
+        # Cars state
+        self.x = np.zeros(n_cars)
+        self.y = np.zeros(n_cars)
+        self.heading = np.zeros(n_cars)
+        self.speed = np.zeros(n_cars)
+        # Index of the closest point of the centerline and unwrapped progress along the centerline (in number of points)
+        self.track_idx = np.zeros(n_cars, dtype=np.int64)
+        self.progress = np.zeros(n_cars, dtype=np.int64)
+        # Run state
+        self.n_cp = np.zeros(n_cars, dtype=np.int64)
+        self.run_time = np.zeros(n_cars)
+        self.last_cp_time = np.zeros(n_cars)
+        self.finished = np.zeros(n_cars, dtype=bool)
+
+    def createTrack(self, track_radius, seed):
+        """
+            Create a random smooth closed centerline, resampled with a constant spacing
+        """
+        rng = np.random.RandomState(seed)
+        theta = np.linspace(0, 2 * np.pi, 2048, endpoint=False)
+        # Sum of a few harmonics keeps the loop smooth
+        r = np.ones_like(theta)
+        for k in range(2, 5):
+            r += rng.uniform(-0.2, 0.2) * np.cos(k * theta + rng.uniform(0, 2 * np.pi)) / k * 2
+        r *= track_radius
+        x, y = r * np.cos(theta), r * np.sin(theta)
+        # Resample by arc length
+        segments = np.hypot(np.diff(x, append=x[:1]), np.diff(y, append=y[:1]))
+        arc = np.concatenate(([0], np.cumsum(segments)))
+        self.track_length = arc[-1]
+        n_points = int(self.track_length / 0.5)
+        s = np.linspace(0, self.track_length, n_points, endpoint=False)
+        self.cx = np.interp(s, arc, np.append(x, x[0]))
+        self.cy = np.interp(s, arc, np.append(y, y[0]))
+        self.n_points = n_points
+        self.point_spacing = self.track_length / n_points
+        # Progress (in points) needed to cross each checkpoint, the finish line being the last one
+        self.cp_progress = np.array([(i + 1) * n_points // (self.n_checkpoints + 1) for i in range(self.n_checkpoints)] + [n_points])
+        # Points around the closest one that are searched when a car moves
+        max_move = 60 * self.dt / self.n_substeps
+        window = int(np.ceil(max_move / self.point_spacing)) + 2
+        self.search_offsets = np.arange(-window, window + 1)
+
+    def renderMap(self):
+        """
+            Render the top-down map of the track once. The frames are crops of this map
+        """
+        h, w = config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH
+        scale = 1 / self.meters_per_pixel
+        # Margins of half a frame so every crop stays inside the map
+        self.origin_x = self.cx.min() - self.track_width - w / 2 / scale
+        self.origin_y = self.cy.min() - self.track_width - h / 2 / scale
+        map_w = int(np.ceil((self.cx.max() + self.track_width + w / 2 / scale - self.origin_x) * scale)) + w
+        map_h = int(np.ceil((self.cy.max() + self.track_width + h / 2 / scale - self.origin_y) * scale)) + h
+        track_map = np.full((map_h, map_w), GRASS_COLOR, dtype=np.uint8)
+        points = np.stack(self.toPixels(self.cx, self.cy), axis=-1).astype(np.int32)
+        cv2.polylines(track_map, [points], True, ROAD_COLOR, int(round(self.track_width * scale)))
+        # Checkpoints and finish line are lines across the road
+        for progress in self.cp_progress:
+            i = progress % self.n_points
+            tx, ty = self.cx[(i + 1) % self.n_points] - self.cx[i - 1], self.cy[(i + 1) % self.n_points] - self.cy[i - 1]
+            norm = np.hypot(tx, ty)
+            nx, ny = -ty / norm * self.track_width / 2, tx / norm * self.track_width / 2
+            p1 = self.toPixels(self.cx[i] + nx, self.cy[i] + ny)
+            p2 = self.toPixels(self.cx[i] - nx, self.cy[i] - ny)
+            cv2.line(track_map, (int(p1[0]), int(p1[1])), (int(p2[0]), int(p2[1])), CHECKPOINT_COLOR, 2)
+        self.track_map = track_map
+        # View of every possible crop of the map. Cropping the frames of all the cars is a single fancy indexing
+        self.crops = np.lib.stride_tricks.sliding_window_view(track_map, (h, w))
+
+    def toPixels(self, x, y):
+        """
+            Convert world coordinates (in meters) to map coordinates (in pixels)
+        """
+        return (x - self.origin_x) / self.meters_per_pixel, (y - self.origin_y) / self.meters_per_pixel
+
+    def reset(self, mask=None):
+        """
+            Put the cars selected by "mask" (all of them by default) back on the starting line
+        """
+        if mask is None:
+            mask = np.ones(self.n_cars, dtype=bool)
+        self.x[mask] = self.cx[0]
+        self.y[mask] = self.cy[0]
+        self.heading[mask] = np.arctan2(self.cy[1] - self.cy[0], self.cx[1] - self.cx[0])
+        self.speed[mask] = 0
+        self.track_idx[mask] = 0
+        self.progress[mask] = 0
+        self.n_cp[mask] = 0
+        self.run_time[mask] = 0
+        self.last_cp_time[mask] = 0
+        self.finished[mask] = False
+
+    def step(self, actions):
+        """
+            Apply one action per car during one step (1 / ENV_MAX_FPS seconds of simulated time)
+
+            return:
+                tuple of arrays:
+                    rewards: Reward obtained by each car
+                    dones: Wether the run of each car is finished (finish line crossed or timeout)
+                    finished: Wether each car crossed the finish line during this step
+                    prop_before_timeout: Proportion of ENV_PLAYING_TIMEOUT left before the timeout
+        """
+        throttle, steering = SIM_ACTIONS[actions].T
+        dt = self.dt / self.n_substeps
+        for _ in range(self.n_substeps):
+            # Longitudinal dynamics: engine, brakes and drag. The grass slows the car down
+            on_road = self.updateTrackPosition()
+            accel = np.where(throttle > 0, 14.0, np.where(throttle < 0, -20.0, 0.0))
+            drag = np.where(on_road, 0.15, 1.5) * self.speed
+            self.speed = np.clip(self.speed + (accel - drag) * dt, -8, 60)
+            # Turning requires the car to move
+            self.heading += steering * 1.6 * np.clip(np.abs(self.speed) / 10, 0, 1) * np.sign(self.speed) * dt
+            self.x += np.cos(self.heading) * self.speed * dt
+            self.y += np.sin(self.heading) * self.speed * dt
+        self.updateTrackPosition()
+        self.run_time += self.dt
+
+        rewards = np.full(self.n_cars, config.ENV_DEFAULT_REWARD, dtype=np.float64)
+        # Checkpoints and finish line are crossed in order
+        next_cp = self.cp_progress[np.minimum(self.n_cp, self.n_checkpoints)]
+        crossed = (self.progress >= next_cp) & ~self.finished
+        finish = crossed & (self.n_cp == self.n_checkpoints)
+        cp = crossed & ~finish
+        self.n_cp[cp] += 1
+        self.last_cp_time[cp] = self.run_time[cp]
+        rewards[cp] = config.ENV_CP_REWARD
+        rewards[finish] = config.ENV_FINISH_REWARD
+        self.finished |= finish
+
+        dones = self.finished.copy()
+        if config.ENV_PLAYING_TIMEOUT > 0:
+            time_before_timeout = config.ENV_PLAYING_TIMEOUT - (self.run_time - self.last_cp_time)
+            dones |= time_before_timeout <= 0
+            prop_before_timeout = time_before_timeout / config.ENV_PLAYING_TIMEOUT
+        else:
+            prop_before_timeout = np.ones(self.n_cars)
+        return rewards, dones, finish, prop_before_timeout
+
+    def updateTrackPosition(self):
+        """
+            Update the closest point of the centerline and the progress of each car. Return wether each car is on the road
+        """
+        candidates = (self.track_idx[:, None] + self.search_offsets[None, :]) % self.n_points
+        d2 = (self.cx[candidates] - self.x[:, None]) ** 2 + (self.cy[candidates] - self.y[:, None]) ** 2
+        best = np.argmin(d2, axis=1)
+        new_idx = candidates[np.arange(self.n_cars), best]
+        # Unwrapped progress so that the loop closes on the finish line
+        delta = (new_idx - self.track_idx + self.n_points // 2) % self.n_points - self.n_points // 2
+        self.progress += delta
+        self.track_idx = new_idx
+        return d2[np.arange(self.n_cars), best] <= (self.track_width / 2) ** 2
+
+    def render(self):
+        """
+            Return the top-down frame centered on each car. Array of shape (n_cars, CAPTURE_IMG_HEIGHT, CAPTURE_IMG_WIDTH)
+        """
+        h, w = config.CAPTURE_IMG_HEIGHT, config.CAPTURE_IMG_WIDTH
+        px, py = self.toPixels(self.x, self.y)
+        left = np.clip(np.round(px).astype(np.int64) - w // 2, 0, self.crops.shape[1] - 1)
+        top = np.clip(np.round(py).astype(np.int64) - h // 2, 0, self.crops.shape[0] - 1)
+        frames = self.crops[top, left]
+        # Draw the car as a short segment pointing in its heading
+        lengths = np.arange(-2, 5)
+        rows = np.clip(h // 2 + np.round(np.sin(self.heading)[:, None] * lengths[None, :]).astype(np.int64), 0, h - 1)
+        cols = np.clip(w // 2 + np.round(np.cos(self.heading)[:, None] * lengths[None, :]).astype(np.int64), 0, w - 1)
+        frames[np.arange(self.n_cars)[:, None], rows, cols] = CAR_COLOR
+        return frames
@@ -0,0 +1,210 @@
+"""
+
+    Vectorized environment running several Trackmania environments in subprocesses.
+
+    Example of use:
+        with VecTMEnv(makeGameEnvFns(2)) as vec_env:
+            states = vec_env.reset()
+            states, rewards, dones, infos = vec_env.step(actions)
+
+"""
+
+import multiprocessing as mp
+import traceback
+from functools import partial
+import numpy as np
+
+from core.MakeTMEnv import MakeTMEnv
+
+# Time given to each worker to answer or to exit when closing, in seconds
+CLOSE_TIMEOUT = 5
+
+def _worker(connection, env_fn):
+    """
+        Loop of a worker process. Owns one environment and executes the commands sent by the VecTMEnv
+    """
+    make_env = None
+    try:
+        make_env = env_fn()
+        tmenv = make_env.__enter__()
+        connection.send(("ready", tmenv.controller.ACTION_SPACE))
+        while True:
+            command, data = connection.recv()
+            if command == "reset":
+                connection.send(("ok", tmenv.reset()))
+            elif command == "step":
+                state, reward, done, info = tmenv.step(data)
+                if done:
+                    # Automatically start a new episode. The last state of the finished episode is kept in the info
+                    info["terminal_observation"] = state
+                    state = tmenv.reset()
+                connection.send(("ok", (state, reward, done, info)))
+            elif command == "getFPS":
+                connection.send(("ok", tmenv.getFPS()))
+            elif command == "close":
+                break
+            else:
+                raise ValueError("Unknown command: " + str(command))
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        if make_env is not None:
+            make_env.unbind()
+        connection.close()
+
+def _makeGameEnv(port, hwnd, controller_fn):
+    """
+        Create an environment bound to the game instance listening on "port" and displayed in the window "hwnd"
+    """
+    from captures.TMWindowCapture import TMWindowCapture
+    return MakeTMEnv(
+        controller=controller_fn() if controller_fn is not None else None,
+        manual_override=False,
+        capture=TMWindowCapture(hwnd=hwnd),
+        port=port
+    )
+
+def makeGameEnvFns(n_envs, base_port=50000, controller_fn=None):
+    """
+        Return the functions creating environments for the "n_envs" Trackmania windows currently opened.
+        The i-th window is bound to the port base_port + i (set the "Port" setting of the TMForge plugin accordingly)
+
+        params:
+            n_envs: Number of game instances
+            base_port: Port of the first game instance
+            controller_fn: Picklable function creating the controller of an instance. Note that the default TMKeyboard sends its inputs
+                           to the window in the foreground, so several instances need controllers targeting their own window
+    """
+    from utils.WindowCapture import find_windows
+    hwnds = find_windows("Trackmania")
+    if len(hwnds) < n_envs:
+        raise Exception("Found {} Trackmania windows but {} are required".format(len(hwnds), n_envs))
+    return [partial(_makeGameEnv, base_port + i, hwnds[i], controller_fn) for i in range(n_envs)]
+
+def makeMockEnvFns(n_envs, base_port=50000, **kwargs):
+    """
+        Return the functions creating "n_envs" environments backed by local stand-ins for the game (see MakeMockTMEnv)
+    """
+    from core.MakeMockTMEnv import MakeMockTMEnv
+    return [partial(MakeMockTMEnv, port=base_port + i, **kwargs) for i in range(n_envs)]
+
+class VecTMEnv:
+    """
+        Vectorized environment running several Trackmania environments in subprocesses.
+        Returns batched observations, rewards and dones. Finished environments are reset automatically.
+    """
+    def __init__(self, env_fns):
+        """
+            params:
+                env_fns: List of picklable functions returning a MakeTMEnv (e.g functools.partial(MakeTMEnv, port=50001, ...))
+        """
+        self.n_envs = len(env_fns)
+        self.connections = []
+        self.processes = []
+        for env_fn in env_fns:
+            parent_connection, child_connection = mp.Pipe()
+            process = mp.Process(target=_worker, args=(child_connection, env_fn), daemon=True)
+            process.start()
+            child_connection.close()
+            self.connections.append(parent_connection)
+            self.processes.append(process)
+        self.waiting = False
+        self.closed = False
+        # Wait for all the environments to be bound
+        self.ACTION_SPACE = self._receiveAll()[0]
+
+    def _receiveAll(self):
+        """
+            Receive the answer of every worker. Raise an error if one of them failed, once all the answers are read so that
+            no pipe is left with a pending answer
+        """
+        results = []
+        errors = []
+        for i, connection in enumerate(self.connections):
+            status, data = connection.recv()
+            if status == "error":
+                errors.append("Environment {} failed:\n{}".format(i, data))
+            results.append(data)
+        if len(errors) > 0:
+            raise Exception("\n".join(errors))
+        return results
+
+    def reset(self):
+        """
+            Reset every environment. Return the stacked initial states
+        """
+        for connection in self.connections:
+            connection.send(("reset", None))
+        return np.stack(self._receiveAll(), axis=0)
+
+    def step_async(self, actions):
+        """
+            Send one action to each environment and return immediately
+        """
+        if self.waiting:
+            raise Exception("step_async called twice without step_wait")
+        for connection, action in zip(self.connections, actions):
+            connection.send(("step", action))
+        self.waiting = True
+
+    def step_wait(self):
+        """
+            Wait for the environments to finish their steps.
+            Return the stacked states, the rewards and dones as arrays, and the list of infos
+        """
+        if not self.waiting:
+            raise Exception("step_wait called without step_async")
+        try:
+            results = self._receiveAll()
+        finally:
+            self.waiting = False
+        states, rewards, dones, infos = zip(*results)
+        return np.stack(states, axis=0), np.array(rewards, dtype=np.float32), np.array(dones, dtype=bool), list(infos)
+
+    def step(self, actions):
+        """
+            Perform one action in each environment. See step_wait for the returned values
+        """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def getFPS(self):
+        """
+            Return the FPS of each environment
+        """
+        for connection in self.connections:
+            connection.send(("getFPS", None))
+        return self._receiveAll()
+
+    def close(self):
+        """
+            Stop the environments and join the worker processes
+        """
+        if self.closed:
+            return
+        # A worker that crashed has closed its end of the pipe: skip it and make sure the others are still stopped
+        for connection in self.connections:
+            try:
+                # Drop the answer to a step still in progress, without blocking on a worker that won't answer
+                if self.waiting and connection.poll(CLOSE_TIMEOUT):
+                    connection.recv()
+                connection.send(("close", None))
+            except (BrokenPipeError, EOFError, ConnectionResetError):
+                pass
+        self.waiting = False
+        for process in self.processes:
+            process.join(timeout=CLOSE_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for connection in self.connections:
+            connection.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
@@ -0,0 +1,52 @@
+"""
+
+    Virtual device driving a MockOpenplanet instead of the game. inherit from TMDevice
+
+"""
+
+from core.TMDevice import TMDevice
+
+class TMMockDevice(TMDevice):
+    """
+        Virtual device driving a MockOpenplanet instead of the game. inherit from TMDevice
+    """
+    ACTION_SPACE = 7
+    def __init__(self, mock_openplanet, restart_delay=3):
+        """
+            params:
+                mock_openplanet (MockOpenplanet): The mock to restart when the run is reset
+                restart_delay: Number of messages the mock still sends about the previous run after a reset, like the game does
+        """
+        self.mock_openplanet = mock_openplanet
+        self.restart_delay = restart_delay
+        self.last_action = None
+
+    def performAction(self, action):
+        """
+            Keep track of the given action
+        """
+        self.last_action = action
+
+    def reset(self):
+        """
+            Reset the run of the mock
+        """
+        self.mock_openplanet.restart(delay_messages=self.restart_delay)
+
+    def getActionOverride(self):
+        """
+            There is no physical device to override the actions
+        """
+        return None
+
+    def actionToString(self, action):
+        """
+            Return the string representation of the action
+        """
+        return str(action)
+
+    def releaseEverything(self):
+        """
+            Nothing to release
+        """
+        self.last_action = None
@@ -0,0 +1,49 @@
+"""
+
+    Virtual device of the simulated environments. Same action space as the TMKeyboard. inherit from TMDevice
+
+"""
+
+from core.TMDevice import TMDevice
+from core.TrackSimulator import SIM_ACTIONS
+
+# String representation of the (throttle, steering) of each action
+SIM_ACTIONS_STR = ["", "→", "←", "↓", "↑", "↑→", "↑←"]
+
+class TMSimController(TMDevice):
+    """
+        Virtual device of the simulated environments. The actions are applied by the simulator itself
+    """
+    ACTION_SPACE = len(SIM_ACTIONS)
+    def __init__(self):
+        self.last_action = None
+
+    def performAction(self, action):
+        """
+            Keep track of the given action
+        """
+        self.last_action = action
+
+    def reset(self):
+        """
+            The run is reset by the simulator
+        """
+        pass
+
+    def getActionOverride(self):
+        """
+            There is no physical device to override the actions
+        """
+        return None
+
+    def actionToString(self, action):
+        """
+            Return the string representation of the action
+        """
+        return SIM_ACTIONS_STR[action]
+
+    def releaseEverything(self):
+        """
+            Nothing to release
+        """
+        self.last_action = None
@@ -0,0 +1,71 @@
+"""
+
+    Load test of the OpenPlanetBridge using a MockOpenplanet sending at a given rate
+
+"""
+
+import argparse
+import time
+import numpy as np
+
+from core.OpenPlanetBridge import OpenPlanetBridge
+from core.MockOpenplanet import MockOpenplanet, makeEpisodeScript
+
+def run(rate, duration, port):
+    """
+        Send messages to the bridge at "rate" messages per second during "duration" seconds and report how the bridge keeps up
+    """
+    bridge = OpenPlanetBridge(port)
+    # A run that never ends so the in-game time keeps increasing
+    mock = MockOpenplanet(makeEpisodeScript(countdown=0), rate=rate, port=port)
+    bridge.capture()
+    mock.start()
+    # Wait for the connection
+    while bridge.getState() is None:
+        time.sleep(0.01)
+
+    sent_start, received_start = mock.getSentCount(), bridge.getSequence()
+    parsed_start, skipped_start = bridge.getMessageCount(), bridge.getSkippedCount()
+    staleness = []
+    lag = []
+    tstart = time.perf_counter()
+    while time.perf_counter() - tstart < duration:
+        # Difference between the in-game time of the mock and the one seen by the bridge
+        staleness.append(mock.getElapsed() - bridge.getTime() / 1000)
+        # Number of messages sent but not yet received by the bridge
+        lag.append(mock.getSentCount() - bridge.getSequence())
+        time.sleep(0.001)
+    mock.stop()
+    elapsed = time.perf_counter() - tstart
+    # Let the bridge read what is still in flight
+    time.sleep(0.1)
+    sent = mock.getSentCount() - sent_start
+    received = bridge.getSequence() - received_start
+    parsed = bridge.getMessageCount() - parsed_start
+    skipped = bridge.getSkippedCount() - skipped_start
+
+    bridge.stop()
+
+    staleness = np.array(staleness) * 1000
+    print("Sent: {} messages ({:.0f} msg/s)".format(sent, sent / elapsed))
+    print("Received: {} messages ({:.0f} msg/s)".format(received, received / elapsed))
+    print("Parsed: {} messages ({:.0f} msg/s)".format(parsed, parsed / elapsed))
+    print("Skipped: {} messages superseded by a newer one ({:.2f}%)".format(skipped, 100 * skipped / max(received, 1)))
+    print("Dropped: {} messages never received ({:.2f}%)".format(sent - received, 100 * (sent - received) / max(sent, 1)))
+    print("Staleness (ms): mean {:.2f} | p50 {:.2f} | p95 {:.2f} | p99 {:.2f} | max {:.2f}".format(
+        staleness.mean(),
+        np.percentile(staleness, 50),
+        np.percentile(staleness, 95),
+        np.percentile(staleness, 99),
+        staleness.max()
+    ))
+    print("Lag (messages): mean {:.2f} | max {}".format(np.mean(lag), np.max(lag)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test of the openplanet bridge using a mock of the openplanet script')
+    parser.add_argument('--rate', type=float, default=1000, help='Number of messages sent per second')
+    parser.add_argument('--duration', type=float, default=10, help='Duration of the test in seconds')
+    parser.add_argument('--port', type=int, default=50000, help='Port of the bridge')
+
+    args = parser.parse_args()
+    run(args.rate, args.duration, args.port)
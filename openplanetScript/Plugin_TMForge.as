@@ -2,6 +2,9 @@
 #author "Théo Boyer"
 #category "Reinforcement learning"
 
+[Setting name="Port" description="Port of the TMForge environment. Use a different port for each game instance"]
+int Setting_Port = 50000;
+
 
 bool inGame = false;
 bool strictMode = false;
@@ -18,7 +21,7 @@ void SendMessage(const string message) {
   if(sock.CanWrite()) {
       if(!sock.WriteRaw(message)) {
         sock.Close();
-        if(!sock.Connect("localhost", 50000)) {
+        if(!sock.Connect("localhost", Setting_Port)) {
             print("Server isn't turned on");
             sock.Close();
         }
@@ -132,7 +135,7 @@ void Update(float dt) {
 }
 
 void Main() {
-    if(!sock.Connect("localhost", 50000)) {
+    if(!sock.Connect("localhost", Setting_Port)) {
         print("Server isn't turned on");
         return;
     }
@@ -4,14 +4,22 @@
 
 """
 
+import argparse
 from random import randint
 from core.MakeTMEnv import MakeTMEnv
 
-def run():
+def run(mock=False):
     """
         Little script to test the TMForge binding
+        params:
+            mock: Wether to use local stand-ins (MockOpenplanet and synthetic capture) instead of the game
     """
-    with MakeTMEnv() as tmenv:
+    if mock:
+        from core.MakeMockTMEnv import MakeMockTMEnv
+        make_env = MakeMockTMEnv()
+    else:
+        make_env = MakeTMEnv()
+    with make_env as tmenv:
         state = tmenv.reset()
         for t in range(100):
             print("State shape:", state.shape, end=" | ")
@@ -26,4 +34,12 @@ def run():
                 break
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Test the TMForge binding')
+    parser.add_argument(
+        '--mock',
+        action='store_true',
+        help='Use local stand-ins for the game instead of Trackmania'
+    )
+
+    args = parser.parse_args()
+    run(args.mock)
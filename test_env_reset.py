@@ -0,0 +1,30 @@
+"""
+
+    Test of TMEnv.reset against a MockOpenplanet that, like the game, keeps describing the previous run for a few messages after a reset
+
+"""
+
+from core.MakeMockTMEnv import MakeMockTMEnv
+from core.MockOpenplanet import makeEpisodeScript
+
+def run(n_episodes=4, n_steps=15):
+    """
+        Reset in the middle of runs that never end and check that the steps after each reset are in run
+    """
+    make_env = MakeMockTMEnv(script=makeEpisodeScript(countdown=1.0, finish=None))
+    tmenv = make_env.__enter__()
+    try:
+        for _ in range(n_episodes):
+            tmenv.reset()
+            for _ in range(n_steps):
+                # Raises "You are currently not in run" if reset returned on a state older than the reset
+                tmenv.step(0)
+    finally:
+        make_env.unbind()
+
+def test_resetWaitsForTheRestart():
+    run()
+
+if __name__ == "__main__":
+    run()
+    print("Resets OK")
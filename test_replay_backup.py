@@ -0,0 +1,84 @@
+"""
+
+    Test of the incremental backups of the DQN replay buffer: save after every episode until the buffer wraps, then reload
+
+"""
+
+import os
+import sys
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "algorithms", "DQN"))
+
+from package.ReplayBuffer import ReplayBuffer
+from package.FrameReplayBuffer import FrameReplayBuffer
+from package.ReplayChunkBackup import ReplayChunkBackup
+from utils.BackgroundWriter import BackgroundWriter
+
+BUFFER_SIZE = 50
+EPISODE_STEPS = 20
+N_EPISODES = 6
+N_FRAMES = 2
+
+def makeEpisode(rng, episode):
+    """
+        Return the states (time left plane + N_FRAMES frames sliding by one each step), actions, rewards and dones of an episode
+    """
+    frames = rng.integers(0, 256, size=(EPISODE_STEPS + N_FRAMES - 1, 4, 4), dtype=np.uint8)
+    for t in range(EPISODE_STEPS):
+        state = np.empty((N_FRAMES + 1, 4, 4), dtype=np.uint8)
+        state[0] = EPISODE_STEPS - t
+        state[1:] = frames[t:t + N_FRAMES]
+        yield state, (episode + t) % 5, float(t), t == EPISODE_STEPS - 1
+
+def getOrderedTransitions(replay_buffer):
+    """
+        Return the stored transitions from the oldest to the newest
+    """
+    positions = (replay_buffer.cursor - replay_buffer.size + np.arange(replay_buffer.size)) % replay_buffer.capacity
+    return (
+        replay_buffer.getStates(positions),
+        replay_buffer.actions[positions],
+        replay_buffer.rewards[positions],
+        replay_buffer.dones[positions]
+    )
+
+def run(make_buffer, directory):
+    """
+        Fill a replay buffer episode by episode, backing it up after each one like DQNWrapper.saveState, then rebuild it from the last backup
+    """
+    rng = np.random.default_rng(0)
+    writer = BackgroundWriter()
+    replay_buffer = make_buffer()
+    backup = ReplayChunkBackup(replay_buffer, directory, writer)
+    manifest = None
+    for episode in range(N_EPISODES):
+        for state, action, reward, done in makeEpisode(rng, episode):
+            replay_buffer.add(state, action, reward, done)
+        manifest = backup.save()
+        backup.removeObsolete()
+    writer.close()
+    assert replay_buffer.n_added > BUFFER_SIZE, "The replay buffer should have wrapped"
+    for chunk in manifest:
+        assert os.path.isfile(chunk["path"]), "The backup references a deleted chunk: " + chunk["path"]
+
+    restored = make_buffer()
+    ReplayChunkBackup(restored, directory, BackgroundWriter()).load(manifest)
+    assert restored.n_added == replay_buffer.n_added
+    assert len(restored) == len(replay_buffer)
+    for expected, actual in zip(getOrderedTransitions(replay_buffer), getOrderedTransitions(restored)):
+        assert np.array_equal(expected, actual)
+
+def test_backupAfterWrap():
+    with tempfile.TemporaryDirectory() as directory:
+        run(lambda: ReplayBuffer(BUFFER_SIZE), directory)
+
+def test_frameBackupAfterWrap():
+    with tempfile.TemporaryDirectory() as directory:
+        run(lambda: FrameReplayBuffer(BUFFER_SIZE, n_frames=N_FRAMES), directory)
+
+if __name__ == "__main__":
+    test_backupAfterWrap()
+    test_frameBackupAfterWrap()
+    print("Replay buffer backups OK")
@@ -0,0 +1,71 @@
+"""
+
+    Test of VecTMEnv when one of its environments fails during a step: the error is raised and close still returns
+
+"""
+
+import numpy as np
+
+from core.VecTMEnv import VecTMEnv
+
+class FailingController:
+    ACTION_SPACE = 3
+
+class FailingEnv:
+    """
+        Environment whose steps fail if "fail" is set
+    """
+    def __init__(self, fail):
+        self.fail = fail
+        self.controller = FailingController()
+
+    def reset(self):
+        return np.zeros((2, 4, 4), dtype=np.uint8)
+
+    def step(self, action):
+        if self.fail:
+            raise Exception("Simulated failure")
+        return self.reset(), 0.0, False, {}
+
+    def getFPS(self):
+        return 0
+
+class MakeFailingEnv:
+    """
+        Stand-in for MakeTMEnv creating a FailingEnv
+    """
+    def __init__(self, fail):
+        self.fail = fail
+
+    def __enter__(self):
+        return FailingEnv(self.fail)
+
+    def unbind(self):
+        pass
+
+def run():
+    """
+        Step a VecTMEnv whose second environment fails, then close it
+    """
+    vec_env = VecTMEnv([lambda: MakeFailingEnv(False), lambda: MakeFailingEnv(True), lambda: MakeFailingEnv(False)])
+    try:
+        vec_env.reset()
+        try:
+            vec_env.step([0, 0, 0])
+        except Exception as e:
+            assert "Environment 1 failed" in str(e)
+        else:
+            raise AssertionError("The failure of the environment wasn't raised")
+        assert not vec_env.waiting
+    finally:
+        # Used to block forever on the pipes already read by the failed step
+        vec_env.close()
+    for process in vec_env.processes:
+        assert not process.is_alive()
+
+def test_closeAfterFailedStep():
+    run()
+
+if __name__ == "__main__":
+    run()
+    print("VecTMEnv close OK")
@@ -6,11 +6,12 @@
 
 import argparse
 import os
+import shlex
 import sys
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='TMForge environment for reinforcement learning')
-    modes = ['run_algorithm', 'test_experiment', 'test_binding', 'resume_experiment']
+    modes = ['run_algorithm', 'test_experiment', 'test_binding', 'resume_experiment', 'load_test_bridge']
     parser.add_argument(
         'mode',
         choices=modes,
@@ -19,14 +20,15 @@ if __name__ == "__main__":
     parser.add_argument(
         'options',
         type=str,
-        nargs='*',
+        # Everything after the mode is forwarded to its script, including the "--flags"
+        nargs=argparse.REMAINDER,
         help='Parameters of the mode'
     )
 
     args = parser.parse_args()
     command_string = "python ./{script_name}.py {args}".format(
         script_name=args.mode,
-        args = " ".join(args.options)
+        args = shlex.join(args.options)
     )
     
     os.system(command_string)
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+
+    Background writer running disk writes on a dedicated thread, and helper to replace files atomically
+
+"""
+
+import os
+import queue
+import threading
+
+def atomicSave(path, save_func, mode='wb'):
+    """
+        Write a file atomically: save_func(f) writes in a temporary file that then replaces "path".
+        A crash during the writing leaves the previous version of the file untouched
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode) as f:
+        save_func(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class BackgroundWriter:
+    """
+        Execute the submitted jobs one after the other on a background thread, in submission order.
+        An error raised by a job is raised again by the next call to submit or flush
+    """
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                self._jobs.task_done()
+                break
+            func, args = job
+            try:
+                func(*args)
+            except Exception as e:
+                self._error = e
+            self._jobs.task_done()
+
+    def raiseError(self):
+        """
+            Raise the error of a failed job if there is one
+        """
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise Exception("A background write failed") from error
+
+    def submit(self, func, *args):
+        """
+            Schedule the call func(*args) on the background thread and return immediately
+        """
+        self.raiseError()
+        self._jobs.put((func, args))
+
+    def getPendingCount(self):
+        """
+            Return the number of jobs waiting or running
+        """
+        return self._jobs.unfinished_tasks
+
+    def flush(self):
+        """
+            Wait for every submitted job to be done
+        """
+        self._jobs.join()
+        self.raiseError()
+
+    def close(self):
+        """
+            Finish the submitted jobs and stop the thread
+        """
+        if self._thread.is_alive():
+            self._jobs.put(None)
+            self._thread.join()
+        self.raiseError()
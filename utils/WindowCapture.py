@@ -28,6 +28,18 @@ def is_full_screen():
     except:
         return False
 
+def find_windows(window_name):
+    """
+        Return the handles of all the windows having the given name
+    """
+    hwnds = []
+    def callback(hwnd, _):
+        if win32gui.GetWindowText(hwnd) == window_name:
+            hwnds.append(hwnd)
+        return True
+    win32gui.EnumWindows(callback, None)
+    return hwnds
+
 class WindowCapture:
     """
         Class that handles window capture.
@@ -44,14 +56,15 @@ class WindowCapture:
     c = 0
 
     # constructor
-    def __init__(self, window_name):
+    def __init__(self, window_name, hwnd=None):
         """
             params:
                 window_name: name of the window to capture
+                hwnd: handle of the window to capture. Usefull when several windows have the same name. If None the window is found by its name
         """
         # find the handle for the window we want to capture
         self.window_name = window_name
-        self.hwnd = win32gui.FindWindow(None, window_name)
+        self.hwnd = win32gui.FindWindow(None, window_name) if hwnd is None else hwnd
         if not self.hwnd:
             raise Exception('Window not found: {}'.format(window_name))
 
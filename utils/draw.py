@@ -8,10 +8,12 @@
 import numpy as np
 import config
 import cv2
+import time
 
 import utils.Keyboard as Keyboard
 from core.TMForgeUI import TMForgeUI
 from devices.TMKeyboard import TMKeyboard
+from core.MetricColumn import MetricColumn
 from math import ceil, floor
 
 # Default font
@@ -19,11 +21,11 @@ font = cv2.FONT_HERSHEY_DUPLEX
 # Default color
 font_color = (0, 155, 227)
 
-def drawBlackBackground(data):
+def drawBlackBackground(data, window):
     """
         Draw a black image regardless of the given data
     """
-    return np.zeros((config.DRAW_LAYOUT_HEIGHT, config.DRAW_LAYOUT_WIDTH, 3), dtype=np.uint8)
+    return window
 
 def draw_layout_plot(source, data, color):
     """
@@ -47,7 +49,8 @@ def draw_layout_plot(source, data, color):
     )
     # Not sur about that but meh
     if len(data) > 1:
-        vmin, vmax = min(*data), max(*data)
+        data = np.asarray(data)
+        vmin, vmax = data.min(), data.max()
         ymin, ymax = pos[1], pos[1] + size[1]
         dv, dy = vmax - vmin, ymax - ymin
         dv = max(1e-5, dv)
@@ -94,6 +97,13 @@ def draw_layout_plot(source, data, color):
             prev_x, prev = curr_x, curr
     return source
 
+def getLastFormatter(params):
+    """
+        Return the function turning the last value into the text displayed by a "last" drawer (see getLastTypeDrawer for the params)
+    """
+    pattern = params.get("pattern", "{}")
+    return params.get("lambda", lambda x: pattern.format(x))
+
 def getLastTypeDrawer(params):
     """
         Return a drawer that will display the last value
@@ -102,10 +112,8 @@ def getLastTypeDrawer(params):
                 (optionnal) "pattern": string format to display in (for example {:.4f} to display only 4 digits after the point))
                 (optionnal) "lambda": function that handles turn an number into a string (if provided cancel pattern)
     """
-    pattern = params.get("pattern", "{}")
-    lambda_func = params.get("lambda", lambda x: pattern.format(x))
-    def draw(data):
-        window = np.zeros((config.DRAW_LAYOUT_HEIGHT, config.DRAW_LAYOUT_WIDTH, 3), dtype=np.uint8)
+    lambda_func = getLastFormatter(params)
+    def draw(data, window):
         text = lambda_func(data[-1])
         size = 0.7
         text_thickness = 1
@@ -129,8 +137,7 @@ def getKeyboardTypeDrawer(params):
     """
         Return a drawer that will display keyboard actions
     """
-    def draw(data):
-        window = np.zeros((config.DRAW_LAYOUT_HEIGHT, config.DRAW_LAYOUT_WIDTH, 3), dtype=np.uint8)
+    def draw(data, window):
         action = data[-1]
         action_str = TMKeyboard.ActionToString(action)
 
@@ -192,18 +199,18 @@ def getGraphicLastTypeDrawer(params):
                 "maxlen": number of values to plot
                 "approx_type: if "last" -> plot the last values
                               if "moving_average" then reduce the data to maxlen using a non padded moving average (1d convolution)
+        The MetricColumns of Telemetry are reduced without reading their whole history
     """
     maxlen = params["maxlen"]
     approx_type = params["approx_type"]
-    def draw(data):
+    def draw(data, window):
         if approx_type == 'last':
             data = data[-maxlen:]
         elif approx_type == 'moving_average':
             if len(data) > maxlen:
-                data = approximate(data, maxlen)
+                data = data.getMovingAverage(maxlen) if isinstance(data, MetricColumn) else approximate(data, maxlen)
         else:
             raise ValueError("Unkonw approximation method: " + str(approx_type))
-        window = np.zeros((config.DRAW_LAYOUT_HEIGHT, config.DRAW_LAYOUT_WIDTH, 3), dtype=np.uint8)
         window = draw_layout_plot(
             window,
             data,
@@ -212,28 +219,52 @@ def getGraphicLastTypeDrawer(params):
         return window
     return draw
 
-# Bind drawer type to their string names
+# Bind drawer type to their string names. A drawer is called with the data and a black image of the size of a sub-window to draw on
 BINDTYPE2DRAWER = {
     'last': getLastTypeDrawer,
     'keyboard': getKeyboardTypeDrawer,
     'graphic': getGraphicLastTypeDrawer
 }
 
+def getLastKey(formatter):
+    """
+        Return the function giving the text displayed by a "last" drawer, so that it's only redrawn when the text changes
+    """
+    return lambda data: formatter(data[-1])
+
+# Bind drawer type to the function returning what a sub-window displays from its data. The sub-window is only redrawn when it changes
+BINDTYPE2KEY = {
+    'last': lambda params: getLastKey(getLastFormatter(params)),
+    'keyboard': lambda params: lambda data: data[-1],
+    'graphic': lambda params: lambda data: (len(data), data[-1])
+}
+
 class SplittedLayoutWindow:
     """
-        Class that handle an ui from a datasource like Telemetry
+        Class that handle an ui from a datasource like Telemetry.
+        The sub-windows are drawn in a persistent frame and only redrawn when their metric changed since the last refresh
     """
-    def __init__(self, source, shape):
+    def __init__(self, source, shape, refresh_rate=config.DRAW_REFRESH_RATE):
         """
             params:
                 source: data provider (Telemetry)
                 shape: shape of sub-windows. tuple like (nb_rows, nb_columns)
+                refresh_rate: Maximum number of refreshes per second. The calls to draw in between return immediately
         """
         assert len(shape) == 2, "Shape of SplittedLayoutWindow should be of length 2"
         self.source = source
         self.shape = shape
+        self.refresh_rate = refresh_rate
+        self.last_refresh = None
         self.labels = [None for _ in range(shape[0] * shape[1])]
         self.drawers = [drawBlackBackground for _ in range(shape[0] * shape[1])]
+        # Image of the title of each sub-window, rendered when the metric is bound
+        self.titles = [None for _ in range(shape[0] * shape[1])]
+        # What each sub-window displays (see BINDTYPE2KEY), to skip the ones that didn't change
+        self.keys = [None for _ in range(shape[0] * shape[1])]
+        self.displayed = [None for _ in range(shape[0] * shape[1])]
+        self.frame = np.zeros((config.DRAW_LAYOUT_HEIGHT * shape[0], config.DRAW_LAYOUT_WIDTH * shape[1], 3), dtype=np.uint8)
+        self.layout = np.zeros((config.DRAW_LAYOUT_HEIGHT, config.DRAW_LAYOUT_WIDTH, 3), dtype=np.uint8)
         self.ui = TMForgeUI()
 
     def bind(self, index, variable, type, params={}):
@@ -247,35 +278,52 @@ class SplittedLayoutWindow:
         """
         self.labels[index] = variable
         self.drawers[index] = BINDTYPE2DRAWER[type](params)
+        self.keys[index] = BINDTYPE2KEY[type](params)
+        self.titles[index] = self.drawTitle(variable)
+        self.displayed[index] = None
+
+    def drawTitle(self, text):
+        """
+            Return the image of the name of a variable, to put at the top of its sub-window
+        """
+        title = np.zeros((config.DRAW_LAYOUT_TITLE_PADDING, config.DRAW_LAYOUT_WIDTH, 3), dtype=np.uint8)
+        size = 0.3
+        text_thickness = 1
+        textsize = cv2.getTextSize(text, font, size, text_thickness)[0]
+        textX = (config.DRAW_LAYOUT_WIDTH - textsize[0]) / 2
+        textY = (config.DRAW_LAYOUT_TITLE_PADDING + textsize[1]) / 2
+        return cv2.putText(
+            title,
+            text,
+            (int(round(textX)), int(round(textY))), 
+            font, 
+            size,
+            font_color,
+            text_thickness
+        )
 
     def draw(self):
         """
             Draw the UI. Return a boolean saying if the UI request to close the algorithm
         """
-        frame = np.zeros((config.DRAW_LAYOUT_HEIGHT * self.shape[0], config.DRAW_LAYOUT_WIDTH * self.shape[1], 3), dtype=np.uint8)
+        t = time.perf_counter()
+        if self.last_refresh is not None and t - self.last_refresh < 1 / self.refresh_rate:
+            return True
+        self.last_refresh = t
         for i, (label, drawer) in enumerate(zip(self.labels, self.drawers)):
+            if label is None:
+                continue
+            data = self.source.get(label)
+            if data is None or not len(data):
+                continue
+            displayed = self.keys[i](data)
+            if displayed == self.displayed[i]:
+                continue
+            self.displayed[i] = displayed
+            self.layout[:] = 0
+            layout = drawer(data, self.layout)
+            # Display the name of the variable
+            layout[:config.DRAW_LAYOUT_TITLE_PADDING] = np.maximum(layout[:config.DRAW_LAYOUT_TITLE_PADDING], self.titles[i])
             y, x = config.DRAW_LAYOUT_HEIGHT * (i // self.shape[1]), config.DRAW_LAYOUT_WIDTH * (i % self.shape[1])
-            if label is not None:
-                data = self.source.get(label)
-                if data is not None and len(data):
-                    layout = drawer(data)
-                    text = label
-                    size = 0.3
-                    text_thickness = 1
-                    # Display the name of the variable
-                    textsize = cv2.getTextSize(text, font, size, text_thickness)[0]
-                    textX = (config.DRAW_LAYOUT_WIDTH - textsize[0]) / 2
-                    textY = (config.DRAW_LAYOUT_TITLE_PADDING + textsize[1]) / 2
-                    layout = cv2.putText(
-                        layout,
-                        text,
-                        (int(round(textX)), int(round(textY))), 
-                        font, 
-                        size,
-                        font_color,
-                        text_thickness
-                    )
-                    frame[y:y + config.DRAW_LAYOUT_HEIGHT, x:x + config.DRAW_LAYOUT_WIDTH] = layout
-            else:
-                data = None
-        return self.ui.draw(frame)
+            self.frame[y:y + config.DRAW_LAYOUT_HEIGHT, x:x + config.DRAW_LAYOUT_WIDTH] = layout
+        return self.ui.draw(self.frame)